@@ -4,12 +4,48 @@ import numpy as np
 from io import StringIO, BytesIO
 import json
 import os
-from datetime import datetime
+import shutil
+import threading
+import uuid
+from bias_engine import (find_sensitive_columns, find_metric_columns, find_minority_values,
+                         apply_minority_bias)
+from bias_metrics import measure_bias
+from binning import density_grids, histogram_columns, BINNING_METHODS
+from artifacts import ArtifactStore, ARTIFACT_MAX_BYTES, ARTIFACT_TTL
+from instrumentation import StageMetrics, StageProfile
+from datasets import (DatasetStore, DatasetNotFound, DATASET_DIR, DATASET_NAMES,
+                      DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+from jobs import JobQueue, JOB_DIR
+from output_formats import (DEFAULT_FORMAT, extension, format_from_path, merge_parts, mimetype,
+                            read_frame, require_format, write_frame)
+from parallel import start_pool
+from result_cache import ResultCache, content_key
+from streaming import MetricsState, run_chunked_pipeline, DEFAULT_CHUNKSIZE, CHUNKED_UPLOAD_THRESHOLD
+from type_inference import encode_categories, infer_column_types, TYPE_SAMPLE_SIZE
 
 app = Flask(__name__)
+# Worker processes for injecting and analyzing large uploads; 1 keeps everything in the web process
+app.config['BIAS_WORKERS'] = int(os.environ.get('BIAS_WORKERS', 1))
+# Print the head of every upload, DataFrame.info() and full result dicts (costly on wide frames)
+app.config['DEBUG_DUMPS'] = os.environ.get('BIAS_DEBUG_DUMPS', '').lower() in ('1', 'true', 'yes')
+# Let the front web server send /download files (X-Sendfile) instead of a worker
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+result_cache = ResultCache()
+artifacts = ArtifactStore(max_bytes=int(os.environ.get('ARTIFACT_MAX_BYTES', ARTIFACT_MAX_BYTES)),
+                          ttl=int(os.environ.get('ARTIFACT_TTL', ARTIFACT_TTL)),
+                          dataset_dir=DATASET_DIR, job_dir=JOB_DIR)
+datasets = DatasetStore()
+jobs = JobQueue()
+# Per-stage totals of every upload, served at /metrics
+stage_metrics = StageMetrics()
+# Appends rewrite dataset files and metrics state, so they run one at a time
+append_lock = threading.Lock()
 
-def detect_column_types(df):
+def detect_column_types(df, sample_size=TYPE_SAMPLE_SIZE):
     """Detect the type of each column in the dataframe"""
+    if sample_size and len(df) > sample_size:
+        # Large frames: decide from a sample, scanning full columns only when it is ambiguous
+        return infer_column_types(df, sample_size)
     column_types = {}
     for column in df.columns:
         try:
@@ -32,119 +68,79 @@ def detect_column_types(df):
             column_types[column] = 'text'  # Default to text if there's an error
     return column_types
 
-def create_biased_data(df, column_types):
+def create_biased_data(df, column_types, workers=1):
     """Create biased data based on detected column types"""
     try:
         biased_df = df.copy()
         
-        # Find categorical columns that might represent sensitive attributes
-        sensitive_columns = [col for col, type_ in column_types.items() 
-                            if type_ == 'categorical' and 
-                            any(sensitive in col.lower() for sensitive in ['gender', 'race', 'ethnicity', 'sex'])]
-        
-        # Find numeric columns that might represent scores or measurements
-        numeric_columns = [col for col, type_ in column_types.items() 
-                          if type_ == 'numeric' and 
-                          any(metric in col.lower() for metric in ['score', 'rate', 'income', 'salary', 'amount'])]
+        sensitive_columns = find_sensitive_columns(column_types)
+        numeric_columns = find_metric_columns(column_types)
         
         if sensitive_columns and numeric_columns:
-            # Apply bias to numeric columns for each sensitive group
-            for sensitive_col in sensitive_columns:
-                try:
-                    unique_values = biased_df[sensitive_col].unique()
-                    if len(unique_values) >= 2:
-                        # Apply bias to minority groups (assuming first value is majority)
-                        minority_value = unique_values[1]
-                        for numeric_col in numeric_columns:
-                            try:
-                                # Convert to numeric if not already
-                                biased_df[numeric_col] = pd.to_numeric(biased_df[numeric_col], errors='coerce')
-                                
-                                # Reduce values for minority group
-                                mask = biased_df[sensitive_col] == minority_value
-                                if 'score' in numeric_col.lower() or 'rate' in numeric_col.lower():
-                                    biased_df.loc[mask, numeric_col] = biased_df.loc[mask, numeric_col].apply(
-                                        lambda x: max(x * 0.8, x - 20) if pd.notnull(x) else x
-                                    )
-                                elif 'income' in numeric_col.lower() or 'salary' in numeric_col.lower():
-                                    biased_df.loc[mask, numeric_col] = biased_df.loc[mask, numeric_col].apply(
-                                        lambda x: max(x * 0.9, x - 10000) if pd.notnull(x) else x
-                                    )
-                            except Exception as e:
-                                print(f"Error processing numeric column {numeric_col}: {str(e)}")
-                except Exception as e:
-                    print(f"Error processing sensitive column {sensitive_col}: {str(e)}")
+            # Apply bias to minority groups (assuming first value is majority)
+            minority_values = find_minority_values(biased_df, sensitive_columns)
+            apply_minority_bias(biased_df, minority_values, numeric_columns, workers)
         
         return biased_df
     except Exception as e:
         print(f"Error in create_biased_data: {str(e)}")
         return df  # Return original dataframe if there's an error
 
-def analyze_bias(data, column_types):
-    """Analyze bias in the data based on detected column types"""
+def as_frame(data):
+    """Use DataFrames as they are and only build one from a list of records"""
+    return data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+
+def coerce_numeric(df, columns):
+    """Numeric version of each column, converted once and without touching df"""
+    numeric_data = {}
+    for col in columns:
+        try:
+            # to_numeric hands back numeric columns as they are, so this is a view for them
+            numeric_data[col] = pd.to_numeric(df[col], errors='coerce')
+        except Exception as e:
+            print(f"Error converting column {col}: {str(e)}")
+    return numeric_data
+
+def metric_frame(numeric_data, columns):
+    """Frame of the converted metric columns, in the given order"""
+    return pd.DataFrame({col: numeric_data[col] for col in columns if col in numeric_data})
+
+def analyze_bias(data, column_types, numeric_data=None):
+    """Analyze bias in the data based on detected column types
+
+    `data` can be a DataFrame or a list of records. Callers that already
+    converted the metric columns can pass them in to skip that work.
+    """
     try:
-        df = pd.DataFrame(data)
-        
-        bias_metrics = {}
-        bias_present = {}
+        df = as_frame(data)
         
-        # Find sensitive columns
-        sensitive_columns = [col for col, type_ in column_types.items() 
-                            if type_ == 'categorical' and 
-                            any(sensitive in col.lower() for sensitive in ['gender', 'race', 'ethnicity', 'sex'])]
+        sensitive_columns = find_sensitive_columns(column_types)
+        numeric_columns = find_metric_columns(column_types)
         
-        # Find numeric columns
-        numeric_columns = [col for col, type_ in column_types.items() 
-                          if type_ == 'numeric' and 
-                          any(metric in col.lower() for metric in ['score', 'rate', 'income', 'salary', 'amount'])]
-        
-        if sensitive_columns and numeric_columns:
-            for sensitive_col in sensitive_columns:
-                try:
-                    unique_values = df[sensitive_col].unique()
-                    if len(unique_values) >= 2:
-                        majority_value = unique_values[0]
-                        minority_value = unique_values[1]
-                        
-                        bias_metrics[sensitive_col] = {}
-                        bias_present[sensitive_col] = {}
-                        
-                        for numeric_col in numeric_columns:
-                            try:
-                                # Convert to numeric if not already
-                                df[numeric_col] = pd.to_numeric(df[numeric_col], errors='coerce')
-                                
-                                majority_mean = float(df[df[sensitive_col] == majority_value][numeric_col].mean())
-                                minority_mean = float(df[df[sensitive_col] == minority_value][numeric_col].mean())
-                                
-                                bias_metrics[sensitive_col][numeric_col] = {
-                                    f'{majority_value}_mean': majority_mean,
-                                    f'{minority_value}_mean': minority_mean
-                                }
-                                
-                                # Determine if bias is present based on the type of metric
-                                if 'score' in numeric_col.lower() or 'rate' in numeric_col.lower():
-                                    threshold = 20
-                                elif 'income' in numeric_col.lower() or 'salary' in numeric_col.lower():
-                                    threshold = 10000
-                                else:
-                                    threshold = (majority_mean + minority_mean) / 2 * 0.1  # 10% difference
-                                
-                                bias_present[sensitive_col][numeric_col] = bool(abs(majority_mean - minority_mean) > threshold)
-                            except Exception as e:
-                                print(f"Error processing numeric column {numeric_col}: {str(e)}")
-                except Exception as e:
-                    print(f"Error processing sensitive column {sensitive_col}: {str(e)}")
+        if not (sensitive_columns and numeric_columns):
+            return {}, {}
         
+        if numeric_data is None:
+            numeric_data = coerce_numeric(df, numeric_columns)
+        results = measure_bias(df, {'data': metric_frame(numeric_data, numeric_columns)},
+                               sensitive_columns, numeric_columns)
+        bias_metrics, bias_present, _ = results['data']
         return bias_metrics, bias_present
     except Exception as e:
         print(f"Error in analyze_bias: {str(e)}")
         return {}, {}
 
-def prepare_visualization_data(data, column_types):
-    """Prepare visualization data based on detected column types"""
+def prepare_visualization_data(data, column_types, numeric_data=None, bins=None, binning='width', workers=1):
+    """Prepare visualization data based on detected column types
+
+    `data` can be a DataFrame or a list of records; `numeric_data` holds
+    already converted numeric columns. `bins` overrides the number of range
+    buckets and binning='quantile' gives equal-share instead of equal-width
+    buckets to non-score columns. `workers` shards the range counts of
+    large frames over a process pool.
+    """
     try:
-        df = pd.DataFrame(data)
+        df = as_frame(data)
         viz_data = {}
         
         # Add distribution for categorical columns
@@ -157,39 +153,70 @@ def prepare_visualization_data(data, column_types):
         
         # Add ranges for numeric columns
         numeric_columns = [col for col, type_ in column_types.items() if type_ == 'numeric']
-        for col in numeric_columns:
-            try:
-                # Convert to numeric if not already
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-                
-                if 'score' in col.lower() or 'rate' in col.lower():
-                    ranges = {
-                        '0-20%': len(df[df[col] < 20]),
-                        '20-40%': len(df[(df[col] >= 20) & (df[col] < 40)]),
-                        '40-60%': len(df[(df[col] >= 40) & (df[col] < 60)]),
-                        '60-80%': len(df[(df[col] >= 60) & (df[col] < 80)]),
-                        '80-100%': len(df[df[col] >= 80])
-                    }
-                else:
-                    # Calculate dynamic ranges based on data distribution
-                    min_val = df[col].min()
-                    max_val = df[col].max()
-                    range_size = (max_val - min_val) / 4
-                    ranges = {
-                        f'{min_val:.0f}-{min_val+range_size:.0f}': len(df[df[col] < min_val+range_size]),
-                        f'{min_val+range_size:.0f}-{min_val+2*range_size:.0f}': len(df[(df[col] >= min_val+range_size) & (df[col] < min_val+2*range_size)]),
-                        f'{min_val+2*range_size:.0f}-{min_val+3*range_size:.0f}': len(df[(df[col] >= min_val+2*range_size) & (df[col] < min_val+3*range_size)]),
-                        f'{min_val+3*range_size:.0f}-{max_val:.0f}': len(df[df[col] >= min_val+3*range_size])
-                    }
-                viz_data[f'{col}_ranges'] = ranges
-            except Exception as e:
-                print(f"Error processing numeric column {col}: {str(e)}")
+        if numeric_data is None:
+            numeric_data = coerce_numeric(df, numeric_columns)
+        for col, ranges in histogram_columns(numeric_data, numeric_columns, bins, binning, workers).items():
+            viz_data[f'{col}_ranges'] = ranges
         
         return viz_data
     except Exception as e:
         print(f"Error in prepare_visualization_data: {str(e)}")
         return {}
 
+def analyze_datasets(original_df, biased_df, column_types, bins=None, binning='width', workers=1,
+                     progress=None):
+    """
+    Bias metrics and visualization data for the original and biased frames.
+
+    Works on the frames directly: every numeric column is converted once per
+    frame and shared by the metrics and the ranges. When the biased rows line
+    up with the original ones, both datasets are measured together with one
+    groupby per sensitive column. `bins` and `binning` are passed on to
+    prepare_visualization_data; `workers` lets both split large frames into
+    row shards on a process pool. `progress` is called with 'visualize'
+    once the metrics are done. Each dataset also gets a 'density' grid of
+    two numeric columns, on ranges shared by both, so clients can draw the
+    joint distribution without the rows.
+    """
+    frames = {'original': original_df, 'biased': biased_df}
+    sensitive_columns = find_sensitive_columns(column_types)
+    metric_columns = find_metric_columns(column_types)
+    numeric_columns = [col for col, type_ in column_types.items() if type_ == 'numeric']
+    numeric_data = {name: coerce_numeric(frame, numeric_columns) for name, frame in frames.items()}
+    
+    try:
+        if biased_df.index.equals(original_df.index):
+            measured = measure_bias(original_df,
+                                    {name: metric_frame(numeric_data[name], metric_columns) for name in frames},
+                                    sensitive_columns, metric_columns, workers)
+        else:
+            measured = {}
+            for name, frame in frames.items():
+                measured.update(measure_bias(frame, {name: metric_frame(numeric_data[name], metric_columns)},
+                                             sensitive_columns, metric_columns, workers))
+    except Exception as e:
+        print(f"Error in analyze_datasets: {str(e)}")
+        measured = {name: ({}, {}, {}) for name in frames}
+    
+    if progress is not None:
+        progress('visualize')
+    results = {}
+    for name, frame in frames.items():
+        bias_metrics, bias_present, group_metrics = measured[name]
+        results[name] = {
+            'bias_metrics': bias_metrics,
+            'bias_present': bias_present,
+            'group_metrics': group_metrics,
+            'visualization_data': prepare_visualization_data(frame, column_types, numeric_data[name],
+                                                             bins, binning, workers)
+        }
+    try:
+        for name, grid in density_grids(numeric_data, column_types).items():
+            results[name]['visualization_data']['density'] = grid.to_dict()
+    except Exception as e:
+        print(f"Error computing density grids: {str(e)}")
+    return results
+
 def calculate_differences(original_df, biased_df):
     """Calculate differences between original and biased data"""
     differences = {}
@@ -197,11 +224,19 @@ def calculate_differences(original_df, biased_df):
     # Get numeric columns
     numeric_columns = biased_df.select_dtypes(include=[np.number]).columns
     
+    # Group each frame by gender once; every column reuses the grouping. Data
+    # without a gender column gets no per-group differences, as in chunked uploads
+    grouped = 'gender' in original_df.columns and 'gender' in biased_df.columns
+    if grouped:
+        original_groups = original_df.groupby('gender', observed=True)
+        biased_groups = biased_df.groupby('gender', observed=True)
     for col in numeric_columns:
-        # Calculate mean differences by gender
-        gender_diffs = biased_df.groupby('gender')[col].mean() - original_df.groupby('gender')[col].mean()
+        gender_diffs = {}
+        if grouped:
+            # Calculate mean differences by gender
+            gender_diffs = (biased_groups[col].mean() - original_groups[col].mean()).to_dict()
         differences[col] = {
-            'mean_differences': gender_diffs.to_dict(),
+            'mean_differences': gender_diffs,
             'original_mean': original_df[col].mean(),
             'biased_mean': biased_df[col].mean(),
             'total_change': biased_df[col].mean() - original_df[col].mean()
@@ -209,6 +244,185 @@ def calculate_differences(original_df, biased_df):
     
     return differences
 
+def build_upload_result(df, biased_path, bins=None, binning='width', progress=None):
+    """
+    Clean, detect, inject, analyze and write one uploaded frame.
+
+    Returns the response body (without links) plus the cleaned original and
+    biased frames. The biased frame is written in the format implied by the
+    extension of `biased_path`. `progress`, when given, is called with each
+    stage name; a StageProfile also gets the row count of each stage.
+    """
+    report = progress if isinstance(progress, StageProfile) else StageProfile(progress)
+    workers = app.config['BIAS_WORKERS']
+    
+    # Basic data cleaning
+    report('clean', len(df))
+    app.logger.debug("Starting data cleaning...")
+    # Remove rows where all values are NaN
+    df = df.dropna(how='all')
+    # Forward fill NaN values using the recommended method
+    df = df.ffill()
+    app.logger.debug("Data cleaning complete. Shape: %s", df.shape)
+    
+    # Ensure all column names are strings and strip whitespace
+    df.columns = df.columns.str.strip()
+    
+    # Detect column types
+    report('detect', len(df))
+    app.logger.debug("Detecting column types...")
+    column_types = detect_column_types(df)
+    debug_dump("Detected column types", lambda: column_types)
+    # Repeated labels become integer codes shared by the injection and every metric
+    df = encode_categories(df, column_types)
+    
+    # Create biased data
+    report('inject', len(df))
+    app.logger.debug("Creating biased data...")
+    biased_df = create_biased_data(df, column_types, workers)
+    app.logger.debug("Biased data creation complete")
+    
+    # Calculate differences between original and biased data
+    report('analyze', len(df))
+    differences = calculate_differences(df, biased_df)
+    debug_dump("Differences calculated", lambda: differences)
+    
+    # Analyze bias and prepare visualization data for both datasets
+    app.logger.debug("Analyzing original and biased data...")
+    analysis = analyze_datasets(df, biased_df, column_types, bins, binning, workers, report)
+    
+    # Save biased data
+    report('write', len(biased_df))
+    app.logger.debug("Saving biased data...")
+    os.makedirs(os.path.dirname(biased_path), exist_ok=True)
+    write_frame(biased_df, biased_path)
+    app.logger.debug("File saved successfully")
+    
+    result = {
+        'original': analysis['original'],
+        'biased': analysis['biased'],
+        'column_types': column_types,
+        'differences': differences,
+        'row_count': len(df),
+        'columns': list(df.columns)
+    }
+    return result, df, biased_df
+
+def run_upload_job(upload_path, biased_path, original_path, chunksize, bins, binning, progress):
+    """
+    Process a saved upload in a worker process, leaving both datasets on disk
+
+    Returns the result and the profiled stages, which are measured in the worker.
+    """
+    profile = StageProfile(progress)
+    profile('parse')
+    try:
+        if chunksize:
+            result = run_chunked_pipeline(upload_path, biased_path, chunksize, bins, binning,
+                                          original_path, profile, state_path=state_file(original_path),
+                                          dump=debug_dump)
+            result['columns'] = list(pd.read_csv(original_path, nrows=0).columns)
+        else:
+            df = read_frame(upload_path, 'csv')
+            profile.count(len(df))
+            result, df, _ = build_upload_result(df, biased_path, bins, binning, profile)
+            df.to_csv(original_path, index=False)
+    finally:
+        remove_files(upload_path)
+    return result, profile.finish(result['row_count'])
+
+def debug_dump(label, value):
+    """Print a verbose dump when BIAS_DEBUG_DUMPS is set; `value` is only called then"""
+    if app.config['DEBUG_DUMPS']:
+        print(f"{label}:\n{value()}")
+
+def state_file(original_path):
+    """Path of the saved metrics state that belongs next to a stored original dataset"""
+    return f'{os.path.splitext(original_path)[0]}.state'
+
+def dataset_state(dataset_id):
+    """MetricsState of a stored dataset: the one saved by a chunked upload or an append, else built from its rows"""
+    meta = datasets.meta(dataset_id)
+    state_path = state_file(os.path.join(DATASET_DIR, f'{dataset_id}.csv'))
+    if os.path.exists(state_path):
+        state = MetricsState.load(state_path)
+        # The state was saved while the biased output was still being staged
+        state.biased_path = meta['biased_path']
+        return state
+    frames = datasets.frames(dataset_id)
+    if frames is None:
+        # Whole-frame upload processed in the background: both datasets are on disk
+        paths = datasets.paths(dataset_id)
+        frames = {name: encode_categories(read_frame(path), meta['column_types'])
+                  for name, path in paths.items()}
+    return MetricsState.from_frames(frames['original'], frames['biased'], meta['column_types'],
+                                    meta['biased_path'], None, meta['bins'], meta['binning'])
+
+def fork_dataset(dataset_id, fork_id):
+    """
+    Copy an uploaded dataset to `fork_id`, which appends may change; returns (meta, state)
+
+    Upload ids and file names are content hashes, which an upload of the same
+    file relies on, so rows are never appended to the uploaded dataset
+    itself. The first append copies it once; later appends to the copy
+    change it in place.
+    """
+    meta = datasets.meta(dataset_id)
+    state = dataset_state(dataset_id)
+    biased_filename = artifacts.name(fork_id, state.output_format)
+    staging_path = artifacts.staging_path(biased_filename)
+    original_path = os.path.join(DATASET_DIR, f'{fork_id}.csv')
+    os.makedirs(DATASET_DIR, exist_ok=True)
+    frames = datasets.frames(dataset_id)
+    if frames is None:
+        paths = datasets.paths(dataset_id)
+        shutil.copyfile(paths['original'], original_path)
+        shutil.copyfile(paths['biased'], staging_path)
+    else:
+        write_frame(frames['original'], original_path)
+        write_frame(frames['biased'], staging_path)
+    state.original_path = original_path
+    state.biased_path = artifacts.commit(staging_path, biased_filename)
+    return dict(meta, biased_path=state.biased_path, forked_from=dataset_id), state
+
+def remove_files(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def finish_upload(cache_key, result, biased_filename):
+    """Add the dataset and download links to an upload result and return it as JSON"""
+    result['biased']['download_link'] = f'/download/{biased_filename}'
+    result['dataset_id'] = cache_key
+    return cached_response(cache_key, result, artifacts.path(biased_filename))
+
+def cached_response(cache_key, result, artifact_path):
+    """Serialize an upload result once, store it in the result cache and return it"""
+    body = app.json.dumps(result)
+    result_cache.put(cache_key, body, artifact_path)
+    return app.response_class(body, mimetype='application/json')
+
+def job_response(job_id):
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/jobs/{job_id}',
+        'result_url': f'/jobs/{job_id}/result'
+    }), 202
+
+def frame_info(df):
+    buffer = StringIO()
+    df.info(buf=buffer)
+    return buffer.getvalue()
+
+def upload_size(file):
+    """Size of an uploaded file in bytes, leaving the stream at the start"""
+    file.stream.seek(0, os.SEEK_END)
+    size = file.stream.tell()
+    file.stream.seek(0)
+    return size
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -225,88 +439,113 @@ def upload_file():
     if file and file.filename.endswith('.csv'):
         try:
             # Read the CSV file
-            print(f"Attempting to read file: {file.filename}")
-            print(f"File content type: {file.content_type}")
-            print(f"File size: {file.content_length} bytes")
-            
-            # Try to read the first few lines to check format
-            file_content = file.read(1000).decode('utf-8')
-            print(f"First 1000 characters of file:\n{file_content}")
-            
-            # Reset file pointer
-            file.seek(0)
-            
-            # Read the CSV file
-            df = pd.read_csv(file)
-            print(f"Successfully read CSV with columns: {df.columns.tolist()}")
-            print(f"DataFrame shape: {df.shape}")
-            print(f"DataFrame info:\n{df.info()}")
-            
-            # Basic data cleaning
-            print("Starting data cleaning...")
-            # Remove rows where all values are NaN
-            df = df.dropna(how='all')
-            # Forward fill NaN values using the recommended method
-            df = df.ffill()
-            print(f"Data cleaning complete. Shape: {df.shape}")
-            
-            # Ensure all column names are strings and strip whitespace
-            df.columns = df.columns.str.strip()
+            # Progress goes to the DEBUG log, which the app only shows in debug mode
+            app.logger.debug("Attempting to read file: %s", file.filename)
+            app.logger.debug("File content type: %s", file.content_type)
+            app.logger.debug("File size: %s bytes", file.content_length)
+            if app.config['DEBUG_DUMPS']:
+                print(f"First 1000 characters of file:\n{file.read(1000).decode('utf-8', errors='replace')}")
+                file.seek(0)
             
-            # Detect column types
-            print("Detecting column types...")
-            column_types = detect_column_types(df)
-            print(f"Detected column types: {column_types}")
+            # Range buckets: how many, and equal width or equal share (quantile)
+            bins = request.form.get('bins', type=int)
+            binning = request.form.get('binning', 'width')
+            if binning not in BINNING_METHODS or (bins is not None and bins < 1):
+                return jsonify({'error': f'Invalid binning. Use bins >= 1 and one of: {", ".join(BINNING_METHODS)}'}), 400
             
-            # Create biased data
-            print("Creating biased data...")
-            biased_df = create_biased_data(df, column_types)
-            print("Biased data creation complete")
-            
-            # Calculate differences between original and biased data
-            differences = calculate_differences(df, biased_df)
-            print("Differences calculated:", differences)
-            
-            # Analyze bias for both original and biased data
-            print("Analyzing bias in original data...")
-            original_bias_metrics, original_bias_present = analyze_bias(df.to_dict('records'), column_types)
-            print("Analyzing bias in biased data...")
-            biased_bias_metrics, biased_bias_present = analyze_bias(biased_df.to_dict('records'), column_types)
-            
-            # Prepare visualization data for both datasets
-            print("Preparing visualization data...")
-            original_viz_data = prepare_visualization_data(df.to_dict('records'), column_types)
-            biased_viz_data = prepare_visualization_data(biased_df.to_dict('records'), column_types)
+            # Output format of the biased dataset behind the download link
+            output_format = request.form.get('format', DEFAULT_FORMAT)
+            try:
+                require_format(output_format)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-            # Save biased data to a temporary file
-            print("Saving biased data...")
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            biased_filename = f'biased_data_{timestamp}.csv'
+            # Large uploads (or an explicit chunksize) go through the chunked pipeline
+            chunksize = request.form.get('chunksize', type=int)
+            if chunksize is None and upload_size(file) > CHUNKED_UPLOAD_THRESHOLD:
+                chunksize = DEFAULT_CHUNKSIZE
             
-            # Ensure the temp directory exists
-            os.makedirs('static/temp', exist_ok=True)
+            # Identical content with identical parameters gets the stored result
+            cache_key = content_key(file.stream, {'bins': bins, 'binning': binning,
+                                                  'chunked': bool(chunksize), 'format': output_format})
+            run_async = request.form.get('async', '').lower() in ('1', 'true', 'yes')
+            cached = result_cache.get(cache_key)
+            if cached is not None and datasets.has(cache_key):
+                app.logger.debug("Returning cached result for %s", file.filename)
+                if run_async:
+                    # Background uploads always answer with a job, here one that is already done
+                    return job_response(jobs.add_finished(cached))
+                return app.response_class(cached, mimetype='application/json')
             
-            # Save the file
-            biased_df.to_csv(f'static/temp/{biased_filename}', index=False)
-            print("File saved successfully")
+            # Named after the upload's content key: identical uploads share one file
+            biased_filename = artifacts.name(cache_key, output_format)
+            biased_path = artifacts.path(biased_filename)
+            staging_path = artifacts.staging_path(biased_filename)
+            os.makedirs(DATASET_DIR, exist_ok=True)
+            original_path = os.path.join(DATASET_DIR, f'{cache_key}.csv')
+            # Settings a later append needs
+            meta = {'bins': bins, 'binning': binning, 'biased_path': biased_path}
             
-            return jsonify({
-                'original': {
-                    'bias_metrics': original_bias_metrics,
-                    'bias_present': original_bias_present,
-                    'visualization_data': original_viz_data
-                },
-                'biased': {
-                    'bias_metrics': biased_bias_metrics,
-                    'bias_present': biased_bias_present,
-                    'visualization_data': biased_viz_data,
-                    'download_link': f'/download/{biased_filename}'
-                },
-                'column_types': column_types,
-                'original_data': df.to_dict('records'),
-                'biased_data': biased_df.to_dict('records'),
-                'differences': differences
-            })
+            # Kept from eviction while it is processed; a background job releases it when it ends
+            artifacts.pin(cache_key)
+            queued = False
+            try:
+                # Background mode: save the upload and hand it to the job queue
+                if run_async:
+                    upload_path = os.path.join(DATASET_DIR, f'{cache_key}.upload.csv')
+                    file.save(upload_path)
+                    
+                    def register(outcome):
+                        result, stages = outcome
+                        stage_metrics.record(stages, 'chunked' if chunksize else 'frame')
+                        artifacts.commit(staging_path, biased_filename)
+                        datasets.put_files(cache_key, {'original': original_path, 'biased': biased_path},
+                                           result['row_count'], dict(meta, column_types=result['column_types']))
+                        result['biased']['download_link'] = f'/download/{biased_filename}'
+                        result['dataset_id'] = cache_key
+                        result_cache.put(cache_key, app.json.dumps(result), biased_path)
+                        return result
+                    
+                    job_id = jobs.submit(run_upload_job, upload_path, staging_path, original_path,
+                                         chunksize, bins, binning, on_done=register,
+                                         on_exit=lambda: artifacts.unpin(cache_key))
+                    queued = True
+                    app.logger.debug("Queued job %s for %s", job_id, file.filename)
+                    return job_response(job_id)
+                
+                if chunksize:
+                    app.logger.debug("Processing file in chunks of %s rows...", chunksize)
+                    # Requests share this process, so none of them resets its peak RSS
+                    profile = StageProfile(reset_peak=False)
+                    result = run_chunked_pipeline(file, staging_path, chunksize, bins, binning, original_path,
+                                                  profile, state_path=state_file(original_path), dump=debug_dump)
+                    stage_metrics.record(profile.finish(result['row_count']), 'chunked')
+                    artifacts.commit(staging_path, biased_filename)
+                    datasets.put_files(cache_key, {'original': original_path, 'biased': biased_path},
+                                       result['row_count'], dict(meta, column_types=result['column_types']))
+                    result['columns'] = datasets.columns(cache_key)
+                    return finish_upload(cache_key, result, biased_filename)
+                
+                # Read the CSV file (with Arrow's multithreaded reader when pyarrow is installed)
+                profile = StageProfile(reset_peak=False)
+                profile('parse')
+                df = read_frame(file.stream, 'csv')
+                profile.count(len(df))
+                app.logger.debug("Successfully read CSV with columns: %s", df.columns.tolist())
+                app.logger.debug("DataFrame shape: %s", df.shape)
+                debug_dump("DataFrame info", lambda: frame_info(df))
+                
+                result, df, biased_df = build_upload_result(df, staging_path, bins, binning, profile)
+                stage_metrics.record(profile.finish(), 'frame')
+                artifacts.commit(staging_path, biased_filename)
+                
+                # Rows are served page by page from the stored frames
+                datasets.put_frames(cache_key, {'original': df, 'biased': biased_df},
+                                    dict(meta, column_types=result['column_types']))
+                return finish_upload(cache_key, result, biased_filename)
+            finally:
+                if not queued:
+                    artifacts.unpin(cache_key)
         except pd.errors.EmptyDataError:
             return jsonify({'error': 'The uploaded file is empty'}), 400
         except pd.errors.ParserError as e:
@@ -331,18 +570,131 @@ def upload_file():
     
     return jsonify({'error': 'Invalid file type. Please upload a CSV file.'}), 400
 
+@app.route('/datasets/<dataset_id>')
+def dataset_summary(dataset_id):
+    try:
+        return jsonify(datasets.summary(dataset_id))
+    except DatasetNotFound:
+        return jsonify({'error': 'Unknown or expired dataset. Please upload the file again.'}), 404
+
+@app.route('/datasets/<dataset_id>/rows')
+def dataset_rows(dataset_id):
+    name = request.args.get('dataset', 'original')
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    columns = [col for col in request.args.get('columns', '').split(',') if col]
+    
+    if name not in DATASET_NAMES:
+        return jsonify({'error': f'dataset must be one of: {", ".join(DATASET_NAMES)}'}), 400
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'offset must be >= 0 and limit between 1 and {MAX_PAGE_SIZE}'}), 400
+    try:
+        unknown = [col for col in columns if col not in datasets.columns(dataset_id, name)]
+        if unknown:
+            return jsonify({'error': f'Unknown columns: {", ".join(unknown)}'}), 400
+        page = datasets.page(dataset_id, name, offset, limit, columns)
+        # Reading a dataset keeps its files from expiring, like a download
+        artifacts.touch(os.path.basename(datasets.meta(dataset_id)['biased_path']))
+        return jsonify(page)
+    except DatasetNotFound:
+        return jsonify({'error': 'Unknown or expired dataset. Please upload the file again.'}), 404
+
+@app.route('/datasets/<dataset_id>/append', methods=['POST'])
+def append_rows(dataset_id):
+    """
+    Add the rows of a CSV to a stored dataset and return its updated metrics
+
+    Appending to an uploaded dataset creates a copy with a new dataset_id,
+    which the response carries; appends to that copy change it in place.
+    """
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({'error': 'No file part'}), 400
+    fork_id = uuid.uuid4().hex
+    try:
+        with append_lock, artifacts.pinned(dataset_id, fork_id):
+            meta = datasets.meta(dataset_id)
+            forked = 'forked_from' not in meta
+            if forked:
+                meta, state = fork_dataset(dataset_id, fork_id)
+                dataset_id = fork_id
+            else:
+                state = dataset_state(dataset_id)
+            try:
+                appended = state.append(request.files['file'].stream)
+            except Exception:
+                if forked:
+                    # The copy was never registered, so nothing else uses its files
+                    remove_files(state.original_path, state.biased_path)
+                raise
+            state.save(state_file(state.original_path))
+            datasets.put_files(dataset_id, {'original': state.original_path, 'biased': state.biased_path},
+                               state.row_count, meta)
+    except DatasetNotFound:
+        return jsonify({'error': 'Unknown or expired dataset. Please upload the file again.'}), 404
+    except pd.errors.EmptyDataError:
+        return jsonify({'error': 'The uploaded file is empty'}), 400
+    except (ValueError, pd.errors.ParserError, UnicodeDecodeError) as e:
+        return jsonify({'error': f'Could not append rows: {str(e)}'}), 400
+    
+    result = state.result()
+    result['biased']['download_link'] = f'/download/{os.path.basename(state.biased_path)}'
+    result['dataset_id'] = dataset_id
+    result['appended_rows'] = appended
+    return jsonify(result)
+
+@app.route('/metrics')
+def metrics():
+    """Per-stage totals of the uploads handled so far, in the Prometheus text format"""
+    return app.response_class(stage_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if status['state'] == 'failed':
+        return jsonify({'error': f"Error processing file: {status['error']}"}), 500
+    if status['state'] != 'done':
+        return jsonify(status), 202
+    result = jobs.result(job_id)
+    if isinstance(result, bytes):
+        # A cached upload response, already serialized
+        return app.response_class(result, mimetype='application/json')
+    return jsonify(result)
+
 @app.route('/download/<filename>')
 def download_file(filename):
+    """Stream an artifact, honouring Range and conditional requests so large files can be fetched in parts"""
     try:
-        return send_file(
-            f'static/temp/{filename}',
+        path = artifacts.path(filename)
+        if format_from_path(filename) in ('parquet', 'feather'):
+            # Rows appended since the last download are in part files; the download is one file
+            with append_lock:
+                merge_parts(path)
+        response = send_file(
+            path,
+            mimetype=mimetype(format_from_path(filename)),
             as_attachment=True,
-            download_name=filename
+            download_name=filename,
+            conditional=True
         )
     except Exception as e:
         return jsonify({'error': str(e)}), 404
+    artifacts.touch(filename)
+    return response
 
 if __name__ == '__main__':
     # Create temp directory if it doesn't exist
     os.makedirs('static/temp', exist_ok=True)
+    if app.config['BIAS_WORKERS'] > 1 and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Pay the pool's start-up here instead of on the first large upload, in the
+        # reloader's serving process only
+        start_pool(app.config['BIAS_WORKERS'])
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from output_formats import extension
+
+# Biased outputs behind the /download links
+ARTIFACT_DIR = os.path.join('static', 'temp')
+ARTIFACT_PREFIX = 'biased_'
+ARTIFACT_MAX_BYTES = 2 * 1024 ** 3
+# Artifacts not written or downloaded for this long are removed
+ARTIFACT_TTL = 24 * 60 * 60
+CLEANUP_INTERVAL = 10 * 60
+# Never evict an artifact used this recently, even over the size budget
+MIN_AGE = 60
+# Artifacts and dataset files of one upload share the first characters of its key
+GROUP_KEY_LENGTH = 32
+
+class ArtifactStore:
+    """
+    Biased output files served by /download and the dataset files behind
+    them, bounded by size and age.
+
+    Artifacts are named after the content key of the upload they come from
+    (content hash plus parameters), so uploading the same file again reuses
+    one file instead of adding a copy, and different uploads never collide.
+    Files are written under a staging name and renamed into place by
+    commit(), so a download never sees a half-written file even when two
+    identical uploads run at once.
+
+    Files in `dataset_dir` (stored originals, metrics states, saved
+    uploads) are named after the same key. An artifact, its appended part
+    files and its dataset files form one group, which is kept or removed as
+    a whole: a background thread, started by the first commit, removes
+    groups that have not been written or used for `ttl` seconds, then the
+    least recently used ones while all groups together are over
+    `max_bytes`. Use is tracked through the access time, which downloads
+    and page reads set explicitly, so modification times (and the ETags of
+    range requests) stay stable. Groups of uploads and appends still in
+    progress are pinned and never removed. Files in `job_dir` (job
+    progress) only expire after `ttl`.
+    """
+
+    def __init__(self, root=ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_BYTES, ttl=ARTIFACT_TTL,
+                 cleanup_interval=CLEANUP_INTERVAL, dataset_dir=None, job_dir=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self.dataset_dir = dataset_dir
+        self.job_dir = job_dir
+        self.pins = Counter()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def name(self, key, fmt):
+        return f'{ARTIFACT_PREFIX}{key[:32]}{extension(fmt)}'
+
+    def path(self, name):
+        """Path of an artifact; names that could leave the store are refused"""
+        if not name.startswith(ARTIFACT_PREFIX) or os.path.basename(name) != name:
+            raise FileNotFoundError(name)
+        return os.path.join(self.root, name)
+
+    def staging_path(self, name):
+        """Unique path to write an artifact to before commit(); it keeps the artifact's extension"""
+        os.makedirs(self.root, exist_ok=True)
+        return os.path.join(self.root, f'.{uuid.uuid4().hex}.{name}')
+
+    def commit(self, staging_path, name):
+        """Move a written artifact into place and return its path"""
+        path = self.path(name)
+        os.replace(staging_path, path)
+        self.start()
+        return path
+
+    def touch(self, name):
+        """Record a use of an artifact without changing its modification time"""
+        try:
+            path = self.path(name)
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    def pin(self, key):
+        """Keep the group of an upload or append in progress until unpin()"""
+        with self.lock:
+            self.pins[key[:GROUP_KEY_LENGTH]] += 1
+
+    def unpin(self, key):
+        with self.lock:
+            self.pins[key[:GROUP_KEY_LENGTH]] -= 1
+            if self.pins[key[:GROUP_KEY_LENGTH]] <= 0:
+                del self.pins[key[:GROUP_KEY_LENGTH]]
+
+    @contextmanager
+    def pinned(self, *keys):
+        for key in keys:
+            self.pin(key)
+        try:
+            yield
+        finally:
+            for key in keys:
+                self.unpin(key)
+
+    def _group(self, name):
+        """Group key of a file in the artifact directory: that of its upload, staging files included"""
+        start = name.find(ARTIFACT_PREFIX)
+        if start != 0 and not (start > 0 and name.startswith('.')):
+            return None
+        start += len(ARTIFACT_PREFIX)
+        return name[start:start + GROUP_KEY_LENGTH]
+
+    def _scan(self, root):
+        """(name, last use, size, path) of the files in a directory"""
+        files = []
+        try:
+            entries = list(os.scandir(root))
+        except FileNotFoundError:
+            return files
+        for entry in entries:
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((entry.name, max(stat.st_atime, stat.st_mtime), stat.st_size, entry.path))
+        return files
+
+    def _groups(self):
+        """{group key: [(last use, size, path)]} of every artifact, staging and dataset file"""
+        groups = {}
+        for name, used, size, path in self._scan(self.root):
+            key = self._group(name)
+            if key:
+                groups.setdefault(key, []).append((used, size, path))
+        if self.dataset_dir:
+            for name, used, size, path in self._scan(self.dataset_dir):
+                groups.setdefault(name[:GROUP_KEY_LENGTH], []).append((used, size, path))
+        return groups
+
+    def cleanup(self, now=None):
+        """Remove expired groups, then the least recently used while over budget; returns the file count"""
+        now = time.time() if now is None else now
+        removed = 0
+        kept = []
+        total = 0
+        with self.lock:
+            for key, files in self._groups().items():
+                used = max(used for used, _, _ in files)
+                size = sum(size for _, size, _ in files)
+                if key in self.pins:
+                    total += size
+                elif now - used > self.ttl:
+                    # Staging files of crashed writes expire with their group
+                    removed += sum(self._remove(path) for _, _, path in files)
+                else:
+                    kept.append((used, size, files))
+                    total += size
+            for used, size, files in sorted(kept, key=lambda group: group[0]):
+                if total <= self.max_bytes or now - used < MIN_AGE:
+                    break
+                removed += sum(self._remove(path) for _, _, path in files)
+                total -= size
+            if self.job_dir:
+                for _, used, _, path in self._scan(self.job_dir):
+                    if now - used > self.ttl:
+                        removed += self._remove(path)
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def start(self):
+        """Start the background cleanup thread, once"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='artifact-cleanup', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.cleanup()
+            except Exception as e:
+                print(f"Error cleaning up artifacts: {str(e)}")
+            if self.stopping.wait(self.cleanup_interval):
+                return
+
+    def stop(self):
+        self.stopping.set()
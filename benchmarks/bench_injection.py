@@ -0,0 +1,108 @@
+"""
+Rows/sec of the vectorized bias injection engine.
+
+Times apply_minority_bias (the /upload injection) and
+BiasInjector.inject_group_bias on synthetic loan frames (see synthetic.py)
+widened by one score and one feature column. The old
+row-by-row Series.apply version is timed as a reference up to
+--legacy-max-rows, above that it takes minutes. --workers adds runs
+sharded over process pools of those sizes, for every stage that can be
+sharded: group effects (both injections), the group metrics and the
+range counts. Each pool is started before it is timed, and its start-up
+time is printed on its own. The last column is the speed-up over the
+serial run of the same case; a run of several --rows sizes shows where
+it crosses 1, the row count to set PARALLEL_MIN_ROWS to.
+
+    python benchmarks/bench_injection.py
+    python benchmarks/bench_injection.py --rows 10000 1000000
+    python benchmarks/bench_injection.py --rows 10000000 --workers 1 8 32
+    python benchmarks/bench_injection.py --rows 50000 200000 1000000 --workers 1 4
+"""
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from common import ROOT
+from synthetic import make_frame
+
+sys.path.insert(0, ROOT)
+
+from bias_engine import apply_minority_bias  # noqa: E402
+from bias_metrics import measure_bias  # noqa: E402
+from binning import histogram_columns  # noqa: E402
+from main import BiasInjector  # noqa: E402
+from parallel import start_pool  # noqa: E402
+
+def legacy_minority_bias(df, minority_value, numeric_columns):
+    """The per-row injection this engine replaced, kept for comparison"""
+    for numeric_col in numeric_columns:
+        df[numeric_col] = pd.to_numeric(df[numeric_col], errors='coerce')
+        mask = df['gender'] == minority_value
+        if 'score' in numeric_col or 'rate' in numeric_col:
+            df.loc[mask, numeric_col] = df.loc[mask, numeric_col].apply(
+                lambda x: max(x * 0.8, x - 20) if pd.notnull(x) else x
+            )
+        else:
+            df.loc[mask, numeric_col] = df.loc[mask, numeric_col].apply(
+                lambda x: max(x * 0.9, x - 10000) if pd.notnull(x) else x
+            )
+    return df
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bias injection engine')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-max-rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    args = parser.parse_args()
+
+    targets = ['credit_score', 'income', 'score_0', 'feature_1']
+    for workers in args.workers:
+        if workers > 1:
+            start = time.perf_counter()
+            start_pool(workers)
+            print(f"pool start, {workers} workers: {time.perf_counter() - start:.3f}s")
+    print(f"{'rows':>12} {'case':<52} {'seconds':>10} {'rows/sec':>14} {'speed-up':>9}")
+    for rows in args.rows:
+        df = make_frame('loan', rows, extra_columns=2)
+        numeric = df[targets].astype(float)
+        cases = []
+        for workers in args.workers:
+            suffix = '' if workers == 1 else f', {workers} workers'
+            cases += [
+                (f'minority bias, 4 targets{suffix}', lambda workers=workers: apply_minority_bias(
+                    df.copy(), {'gender': 'Female'}, targets, workers)),
+                (f'group bias, 4 groups x 4 targets{suffix}', lambda workers=workers: BiasInjector(
+                    df, workers=workers).inject_group_bias('education_level', targets, 0.3)),
+                (f'group metrics, 2 columns x 4 targets{suffix}', lambda workers=workers: measure_bias(
+                    df, {'original': numeric}, ['gender', 'education_level'], targets, workers)),
+                (f'range counts, 4 targets{suffix}', lambda workers=workers: histogram_columns(
+                    numeric, targets, workers=workers)),
+            ]
+        if rows <= args.legacy_max_rows:
+            cases.append(('legacy apply, 4 targets', lambda: legacy_minority_bias(
+                df.copy(), 'Female', targets)))
+        serial = {}
+        for name, func in cases:
+            case = name.split(', ')
+            if 'workers' in case[-1]:
+                # Warm caches and the pool's imports outside the timed runs
+                func()
+            seconds = best_of(func, args.repeat)
+            key = ', '.join(case[:-1]) if 'workers' in case[-1] else name
+            speedup = serial[key] / seconds if key in serial else 1.0
+            serial.setdefault(key, seconds)
+            print(f"{rows:>12,} {name:<52} {seconds:>10.4f} {rows / seconds:>14,.0f} {speedup:>8.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Cold start time of the command line tool.
+
+Each case runs main.py in a fresh interpreter, so module imports are paid
+on every run: `--help`, a group bias run on a small CSV, and the same run
+with --visualize, the only path that loads matplotlib and seaborn.
+--importtime lists the slowest top-level imports of `main.py --help`.
+--record appends the results as one JSON line to a file, so import cost
+can be followed from commit to commit.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --importtime
+    python benchmarks/bench_startup.py --record benchmarks/startup.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, git_commit
+from synthetic import make_frame
+
+MAIN = os.path.join(ROOT, 'main.py')
+
+def run_times(argv, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + argv, cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+def slowest_imports(count):
+    """(cumulative seconds, module) of the slowest top-level imports of main.py --help"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', MAIN, '--help'], cwd=ROOT,
+                            check=True, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented; their time is already in their parent's
+        if not name.startswith('  '):
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the start-up time of main.py')
+    parser.add_argument('--rows', type=int, default=1000, help='Rows in the small input file')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--importtime', action='store_true', help='List the slowest imports of --help')
+    parser.add_argument('--record', help='Append the results as a JSON line to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, 'small.csv')
+        make_frame('loan', args.rows).to_csv(input_path, index=False)
+        run = [MAIN, input_path, '--group-bias', '--group-column', 'gender',
+               '--group-target', 'income', '--output', os.path.join(tmp, 'biased.csv')]
+        cases = [
+            ('--help', [MAIN, '--help']),
+            (f'group bias, {args.rows:,} rows', run),
+            (f'group bias + --visualize, {args.rows:,} rows',
+             run + ['--visualize', '--plot-columns', 'age', 'income',
+                    '--plot-output', os.path.join(tmp, 'plot.png')]),
+        ]
+        results = {}
+        print(f"{'case':<40} {'best':>8} {'median':>8}")
+        for name, argv in cases:
+            times = run_times(argv, args.repeat)
+            results[name] = {'best': min(times), 'median': statistics.median(times)}
+            print(f"{name:<40} {min(times):>8.3f} {statistics.median(times):>8.3f}")
+
+    if args.importtime:
+        print(f"\n{'slowest imports of --help':<40} {'seconds':>8}")
+        for seconds, module in slowest_imports(10):
+            print(f"{module:<40} {seconds:>8.3f}")
+
+    if args.record:
+        with open(args.record, 'a') as f:
+            f.write(json.dumps({'time': time.time(), 'commit': git_commit(),
+                                'python': sys.version.split()[0], 'repeat': args.repeat,
+                                'results': results}) + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+Stage-by-stage timings of the upload pipeline and the bias injector.
+
+For every schema and row count a seeded synthetic frame is generated (see
+synthetic.py) and each stage is timed on it, with the inputs the pipeline
+gives it: detect_column_types, encode_categories, create_biased_data,
+analyze_bias, prepare_visualization_data, calculate_differences, every
+BiasInjector.inject_* method and the whole /upload request through
+Flask's test client, with an empty result cache (upload) and answered from
+it (upload_cached). Stages print nothing while they are timed.
+
+Results are written as JSON. --compare checks them against an earlier
+file and exits with status 1 when a stage's median time grew by more than
+--tolerance, so a release can be checked against the previous one.
+
+    python benchmarks/bench_suite.py --output bench.json
+    python benchmarks/bench_suite.py --schemas loan --rows 100000 1000000 --extra-columns 20
+    python benchmarks/bench_suite.py --output new.json --compare bench.json --tolerance 0.2
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import ROOT, git_commit
+
+sys.path.insert(0, ROOT)
+
+import app as webapp  # noqa: E402
+from main import BiasInjector  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+from synthetic import SCHEMAS, make_frame  # noqa: E402
+from type_inference import encode_categories  # noqa: E402
+
+UPLOAD_STAGES = ('detect_column_types', 'encode_categories', 'create_biased_data', 'analyze_bias',
+                 'prepare_visualization_data', 'calculate_differences', 'upload', 'upload_cached')
+INJECT_STAGES = ('inject_correlation_bias', 'inject_group_bias', 'inject_selection_bias',
+                 'inject_temporal_bias')
+STAGES = UPLOAD_STAGES + INJECT_STAGES
+
+def injections(schema, df):
+    """Arguments of each BiasInjector.inject_* call on a frame of the schema"""
+    extra = [col for col in df.columns if col.startswith(('score_', 'feature_'))]
+    if schema == 'loan':
+        return {
+            'inject_correlation_bias': ('income', ['credit_score'] + extra, 0.9),
+            'inject_group_bias': ('gender', ['income', 'credit_score'], 0.3),
+            'inject_selection_bias': ('income', float(df['income'].median()), 'above'),
+            # Loans carry no date; age stands in as the ordered axis of the trend
+            'inject_temporal_bias': ('age', 'income', 0.5),
+        }
+    return {
+        'inject_correlation_bias': ('value', extra or ['year'], 0.9),
+        'inject_group_bias': ('industry_code_ANZSIC', ['value'], 0.3),
+        'inject_selection_bias': ('value', float(df['value'].median()), 'above'),
+        'inject_temporal_bias': ('year', 'value', 0.5),
+    }
+
+def time_stage(func, repeat, setup=None):
+    """(seconds of each run, last result); `setup` runs untimed before each one"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            result = func(*args)
+            times.append(time.perf_counter() - start)
+    return times, result
+
+def upload(client, body, fresh_cache):
+    if fresh_cache:
+        webapp.result_cache = ResultCache()
+    response = client.post('/upload', data={'file': (io.BytesIO(body), 'upload.csv')})
+    if response.status_code != 200:
+        raise RuntimeError(f"/upload returned {response.status_code}: {response.get_json().get('error')}")
+    return response
+
+def bench_frame(schema, rows, extra_columns, seed, repeat, stages, workers):
+    """Records of every selected stage on one synthetic frame"""
+    df = make_frame(schema, rows, extra_columns, seed)
+    base = {'schema': schema, 'rows': rows, 'columns': len(df.columns)}
+    state = {}
+
+    def stage_calls():
+        # Each stage gets the outputs of the stages before it, as in build_upload_result
+        yield 'detect_column_types', lambda: webapp.detect_column_types(df), None, 'column_types'
+        yield 'encode_categories', lambda: encode_categories(df, state['column_types']), None, 'encoded'
+        yield ('create_biased_data', lambda: webapp.create_biased_data(state['encoded'], state['column_types'], workers),
+               None, 'biased')
+        yield 'analyze_bias', lambda: webapp.analyze_bias(state['encoded'], state['column_types']), None, None
+        yield ('prepare_visualization_data',
+               lambda: webapp.prepare_visualization_data(state['encoded'], state['column_types'], workers=workers),
+               None, None)
+        yield 'calculate_differences', lambda: webapp.calculate_differences(state['encoded'], state['biased']), None, None
+        client = webapp.app.test_client()
+        body = df.to_csv(index=False).encode()
+        yield 'upload', lambda: upload(client, body, True), None, None
+        yield 'upload_cached', lambda: upload(client, body, False), None, None
+        for name, args in injections(schema, df).items():
+            # Eager injectors: the call itself does the work
+            yield (name, lambda injector, name=name, args=args: getattr(injector, name)(*args),
+                   lambda: (BiasInjector(df, seed=seed),), None)
+
+    records = []
+    for name, func, setup, keep in stage_calls():
+        if name not in stages and keep is None:
+            continue
+        record = dict(base, stage=name)
+        try:
+            times, result = time_stage(func, repeat if name in stages else 1, setup)
+        except Exception as e:
+            record['error'] = f'{type(e).__name__}: {e}'
+            result = None
+            times = None
+        if keep:
+            state[keep] = result
+        if name not in stages:
+            continue
+        if times:
+            median = statistics.median(times)
+            record.update(best=min(times), median=median, times=times, rows_per_sec=rows / median)
+        records.append(record)
+    return records
+
+def record_key(record):
+    return (record['schema'], record['rows'], record['columns'], record['stage'])
+
+def compare(records, baseline_path, tolerance):
+    """Print median time ratios against a baseline file and return the number of regressions"""
+    with open(baseline_path) as f:
+        baseline = {record_key(record): record for record in json.load(f)['results']}
+    regressions = 0
+    print(f"\n{'schema':<8} {'rows':>10} {'stage':<28} {'baseline':>9} {'now':>9} {'ratio':>6}")
+    for record in records:
+        old = baseline.get(record_key(record))
+        if not old or 'median' not in old or 'median' not in record:
+            continue
+        ratio = record['median'] / old['median']
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions += 1
+            flag = '  slower'
+        print(f"{record['schema']:<8} {record['rows']:>10,} {record['stage']:<28} "
+              f"{old['median']:>9.4f} {record['median']:>9.4f} {ratio:>6.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Time every stage of the upload pipeline and the bias injector')
+    parser.add_argument('--schemas', nargs='+', choices=list(SCHEMAS), default=list(SCHEMAS))
+    parser.add_argument('--rows', nargs='+', type=int, default=[10_000, 100_000])
+    parser.add_argument('--extra-columns', nargs='+', type=int, default=[0],
+                        help='Numeric columns added to each schema; one run per value')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help='BIAS_WORKERS of the app (default: 1)')
+    parser.add_argument('--output', '-o', help='Write the results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare with the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed growth of a median time over the baseline (default: 0.2, 20%%)')
+    args = parser.parse_args()
+    # Read before the working directory changes
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    output = os.path.abspath(args.output) if args.output else None
+
+    webapp.app.config['BIAS_WORKERS'] = args.workers
+    records = []
+    print(f"{'schema':<8} {'rows':>10} {'cols':>5} {'stage':<28} {'best':>9} {'median':>9} {'rows/s':>12}")
+    cwd = os.getcwd()
+    # Uploads write their outputs under ./static/temp
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for schema in args.schemas:
+                for rows in args.rows:
+                    for extra_columns in args.extra_columns:
+                        for record in bench_frame(schema, rows, extra_columns, args.seed, args.repeat,
+                                                  args.stages, args.workers):
+                            records.append(record)
+                            prefix = f"{schema:<8} {rows:>10,} {record['columns']:>5} {record['stage']:<28}"
+                            if 'error' in record:
+                                print(f"{prefix} failed: {record['error']}")
+                            else:
+                                print(f"{prefix} {record['best']:>9.4f} {record['median']:>9.4f} "
+                                      f"{record['rows_per_sec']:>12,.0f}")
+        finally:
+            os.chdir(cwd)
+
+    results = {
+        'time': time.time(), 'commit': git_commit(), 'seed': args.seed, 'repeat': args.repeat,
+        'workers': args.workers, 'python': sys.version.split()[0], 'platform': platform.platform(),
+        'cpus': os.cpu_count(), 'pandas': pd.__version__, 'numpy': np.__version__,
+        'results': records,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+    if baseline and compare(records, baseline, args.tolerance):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Seeded synthetic datasets for the benchmarks.
+
+Two schemas follow the data the tool is used on:
+
+- loan: the columns of loan.csv (age, gender, occupation, education_level,
+  marital_status, income, credit_score, loan_status)
+- anzsic: long-format ABS business statistics by ANZSIC industry division
+  (year, industry_code_ANZSIC, industry_name_ANZSIC, rme_size_grp,
+  variable, value, unit)
+
+`extra_columns` widens either schema with numeric columns, alternately
+named score_<i> (biased like credit_score) and feature_<i> (only
+measured). Metric values are continuous, so they stay numeric at any row
+count: the app treats columns with fewer distinct values than half the
+rows as categorical. The same schema, rows, width and seed always give the
+same frame.
+
+    python benchmarks/synthetic.py loan 1000000 -o loan_1m.csv
+    python benchmarks/synthetic.py anzsic 200000 --extra-columns 20 -o anzsic.parquet
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+OCCUPATIONS = ['Engineer', 'Teacher', 'Doctor', 'Nurse', 'Lawyer', 'Accountant', 'Designer',
+               'Developer', 'Manager', 'Sales', 'Chef', 'Artist', 'Scientist', 'Architect']
+EDUCATION_LEVELS = ['High School', "Bachelor's", "Master's", 'PhD']
+MARITAL_STATUSES = ['Single', 'Married', 'Divorced', 'Widowed']
+
+ANZSIC_DIVISIONS = {
+    'A': 'Agriculture, Forestry and Fishing', 'B': 'Mining', 'C': 'Manufacturing',
+    'D': 'Electricity, Gas, Water and Waste Services', 'E': 'Construction',
+    'F': 'Wholesale Trade', 'G': 'Retail Trade', 'H': 'Accommodation and Food Services',
+    'I': 'Transport, Postal and Warehousing', 'J': 'Information Media and Telecommunications',
+    'K': 'Financial and Insurance Services', 'L': 'Rental, Hiring and Real Estate Services',
+    'M': 'Professional, Scientific and Technical Services',
+    'N': 'Administrative and Support Services', 'O': 'Public Administration and Safety',
+    'P': 'Education and Training', 'Q': 'Health Care and Social Assistance',
+    'R': 'Arts and Recreation Services', 'S': 'Other Services',
+}
+RME_SIZE_GROUPS = ['a_0', 'b_1-5', 'c_6-9', 'd_10-19', 'e_20-49', 'f_50-99', 'g_100-199',
+                   'h_200+', 'i_Industry_Total', 'j_Grand_Total']
+# variable -> unit
+ANZSIC_VARIABLES = {
+    'Activity unit': 'COUNT', 'Rolling mean employees': 'COUNT',
+    'Salaries and wages paid': 'DOLLARS(millions)',
+    'Sales, government funding, grants and subsidies': 'DOLLARS(millions)',
+    'Total income': 'DOLLARS(millions)', 'Total expenditure': 'DOLLARS(millions)',
+    'Operating profit before tax': 'DOLLARS(millions)', 'Total assets': 'DOLLARS(millions)',
+    'Fixed tangible assets': 'DOLLARS(millions)',
+}
+
+def loan_frame(rows, rng):
+    gender = rng.choice(['Male', 'Female'], rows)
+    return pd.DataFrame({
+        'age': rng.integers(21, 70, rows),
+        'gender': gender,
+        'occupation': rng.choice(OCCUPATIONS, rows),
+        'education_level': rng.choice(EDUCATION_LEVELS, rows, p=[0.3, 0.4, 0.2, 0.1]),
+        'marital_status': rng.choice(MARITAL_STATUSES, rows, p=[0.4, 0.45, 0.1, 0.05]),
+        'income': rng.lognormal(11, 0.35, rows).round(2),
+        'credit_score': rng.normal(690, 60, rows).clip(300, 850).round(3),
+        'loan_status': rng.choice(['Approved', 'Rejected'], rows, p=[0.7, 0.3]),
+    })
+
+def anzsic_frame(rows, rng):
+    codes = np.array(list(ANZSIC_DIVISIONS))
+    variables = np.array(list(ANZSIC_VARIABLES))
+    code = codes[rng.integers(0, len(codes), rows)]
+    variable = variables[rng.integers(0, len(variables), rows)]
+    return pd.DataFrame({
+        'year': rng.integers(2011, 2024, rows),
+        'industry_code_ANZSIC': code,
+        'industry_name_ANZSIC': pd.Series(code).map(ANZSIC_DIVISIONS).to_numpy(),
+        'rme_size_grp': rng.choice(RME_SIZE_GROUPS, rows),
+        'variable': variable,
+        'value': rng.lognormal(8, 2, rows).round(3),
+        'unit': pd.Series(variable).map(ANZSIC_VARIABLES).to_numpy(),
+    })
+
+SCHEMAS = {'loan': loan_frame, 'anzsic': anzsic_frame}
+
+def make_frame(schema, rows, extra_columns=0, seed=0):
+    """Synthetic frame of `rows` rows in one of SCHEMAS, widened by `extra_columns` numeric columns"""
+    if schema not in SCHEMAS:
+        raise ValueError(f"Unknown schema {schema}. Use one of: {', '.join(SCHEMAS)}")
+    rng = np.random.default_rng(seed)
+    df = SCHEMAS[schema](rows, rng)
+    for i in range(extra_columns):
+        name = f'score_{i}' if i % 2 == 0 else f'feature_{i}'
+        df[name] = rng.normal(500, 100, rows).round(3)
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a seeded synthetic dataset')
+    parser.add_argument('schema', choices=list(SCHEMAS))
+    parser.add_argument('rows', type=int)
+    parser.add_argument('--extra-columns', type=int, default=0, help='Numeric columns added to the schema')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', '-o', required=True, help='Output file (any format main.py writes)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from output_formats import write_frame
+    write_frame(make_frame(args.schema, args.rows, args.extra_columns, args.seed), args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+from parallel import apply_group_effects, use_workers
+
+# Column name fragments that mark a column as a sensitive attribute or as a
+# metric worth biasing/analyzing
+SENSITIVE_KEYWORDS = ['gender', 'race', 'ethnicity', 'sex']
+METRIC_KEYWORDS = ['score', 'rate', 'income', 'salary', 'amount']
+
+def find_sensitive_columns(column_types):
+    """Categorical columns that might represent sensitive attributes"""
+    return [col for col, type_ in column_types.items()
+            if type_ == 'categorical' and
+            any(sensitive in col.lower() for sensitive in SENSITIVE_KEYWORDS)]
+
+def find_metric_columns(column_types):
+    """Numeric columns that might represent scores or measurements"""
+    return [col for col, type_ in column_types.items()
+            if type_ == 'numeric' and
+            any(metric in col.lower() for metric in METRIC_KEYWORDS)]
+
+def is_score_column(col):
+    return 'score' in col.lower() or 'rate' in col.lower()
+
+def is_income_column(col):
+    return 'income' in col.lower() or 'salary' in col.lower()
+
+def bias_threshold(numeric_col, majority_mean, minority_mean):
+    """Mean difference above which a metric is reported as biased"""
+    if is_score_column(numeric_col):
+        return 20
+    elif is_income_column(numeric_col):
+        return 10000
+    return (majority_mean + minority_mean) / 2 * 0.1  # 10% difference
+
+def find_minority_values(df, sensitive_columns):
+    """Second distinct value of each sensitive column, in order of appearance: the group that is penalised"""
+    minority_values = {}
+    for sensitive_col in sensitive_columns:
+        try:
+            unique_values = df[sensitive_col].unique()
+            if len(unique_values) >= 2:
+                minority_values[sensitive_col] = unique_values[1]
+        except Exception as e:
+            print(f"Error processing sensitive column {sensitive_col}: {str(e)}")
+    return minority_values
+
+def minority_rule(col):
+    """(scale, offset) pair that lowers a metric column for a minority group, or None"""
+    if is_score_column(col):
+        return (0.8, 20)
+    elif is_income_column(col):
+        return (0.9, 10000)
+    return None
+
+def inject_group_effects(df, group_col, effects, workers=1):
+    """
+    Apply per-group scale/offset rules to several target columns at once.
+
+    `effects` maps each target column to {group_value: (scale, offset)}; a
+    value x in a matching row becomes max(x * scale, x - offset), so an
+    offset of np.inf gives a plain scaling. Rows of other groups and NaN
+    values are left unchanged. All targets and groups are handled in one
+    batched NumPy operation and the frame is modified in place. Category
+    group columns are matched through their integer codes. With
+    workers > 1, large frames are split into row shards on a process pool.
+    """
+    targets = list(effects)
+    if not targets:
+        return df
+    groups = list(dict.fromkeys(group for rules in effects.values() for group in rules
+                                if pd.notna(group)))
+    if not groups:
+        return df
+
+    # Per-group rule tables, one column per target; groups without a rule keep their values
+    scale = np.ones((len(groups), len(targets)))
+    offset = np.full((len(groups), len(targets)), np.inf)
+    for j, target_col in enumerate(targets):
+        for group, (group_scale, group_offset) in effects[target_col].items():
+            if pd.notna(group):
+                scale[groups.index(group), j] = group_scale
+                offset[groups.index(group), j] = group_offset
+
+    keys = df[group_col]
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        # Look the categories up once and map the row codes; missing values (code -1) map to -1
+        lookup = np.append(pd.Index(groups).get_indexer(keys.cat.categories), -1)
+        codes = lookup[keys.cat.codes.to_numpy()]
+    else:
+        codes = pd.Index(groups).get_indexer(keys)
+    hit = codes >= 0
+    if not hit.any():
+        return df
+
+    values = df[targets].to_numpy(dtype=float, copy=True)
+    if use_workers(workers, len(df)):
+        apply_group_effects(values, codes, scale, offset, workers)
+    else:
+        codes = codes[hit]
+        selected = values[hit]
+        values[hit] = np.maximum(selected * scale[codes], selected - offset[codes])
+
+    for j, target_col in enumerate(targets):
+        column = values[:, j]
+        # Like a lossless pandas setitem, integer columns stay integer while the result is whole
+        if (pd.api.types.is_integer_dtype(df[target_col]) and
+                np.isfinite(column).all() and (column == np.round(column)).all()):
+            column = column.astype(df[target_col].dtype)
+        df[target_col] = column
+    return df
+
+def apply_minority_bias(df, minority_values, numeric_columns, workers=1):
+    """
+    Reduce metric values for the minority group of each sensitive column.
+
+    `minority_values` maps a sensitive column to the group value that gets
+    penalised. The frame is modified in place so that callers working on
+    chunks can decide the groups once for the whole file. `workers` is
+    passed on to inject_group_effects.
+    """
+    if not minority_values:
+        return df
+    for numeric_col in numeric_columns:
+        try:
+            # Convert to numeric if not already
+            df[numeric_col] = pd.to_numeric(df[numeric_col], errors='coerce')
+        except Exception as e:
+            print(f"Error processing numeric column {numeric_col}: {str(e)}")
+
+    targets = [col for col in numeric_columns
+               if minority_rule(col) is not None and pd.api.types.is_numeric_dtype(df[col])]
+    for sensitive_col, minority_value in minority_values.items():
+        try:
+            # Reduce values for minority group, all metric columns in one pass
+            inject_group_effects(df, sensitive_col,
+                                 {col: {minority_value: minority_rule(col)} for col in targets}, workers)
+        except Exception as e:
+            print(f"Error processing sensitive column {sensitive_col}: {str(e)}")
+    return df
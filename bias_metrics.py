@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from bias_engine import bias_threshold
+from parallel import group_aggregate_arrays, use_workers
+
+def group_statistics(numeric_frame, keys):
+    """Mean, count and variance of every column for every group, from a single groupby"""
+    return numeric_frame.groupby(keys, sort=False, observed=True).agg(['mean', 'count', 'var'])
+
+def group_aggregates(numeric_frame, keys):
+    """
+    Count, sum and sum of squares of every column for every group.
+
+    Unlike means these add up, so aggregates of separate chunks or shards can
+    be merged with merge_aggregates and turned into statistics afterwards.
+    """
+    squares = numeric_frame.pow(2)
+    squares.columns = [f'{col}\0sumsq' for col in squares.columns]
+    grouped = pd.concat([numeric_frame, squares], axis=1).groupby(keys, sort=False, observed=True)
+    counts = grouped.count()[list(numeric_frame.columns)]
+    sums = grouped.sum()
+    return pd.concat({
+        'count': counts,
+        'sum': sums[list(numeric_frame.columns)],
+        'sumsq': sums[list(squares.columns)].set_axis(numeric_frame.columns, axis=1)
+    }, axis=1)
+
+def sharded_group_statistics(numeric_frame, keys, workers):
+    """
+    group_statistics computed on a process pool.
+
+    Row shards are aggregated in parallel (see parallel.group_aggregate_arrays)
+    and the partial counts, sums and sums of squares merged before the
+    statistics are derived. Groups keep their order of first appearance.
+    """
+    codes, groups = pd.factorize(keys, sort=False)
+    columns = [numeric_frame.iloc[:, j].to_numpy(dtype=float, na_value=np.nan)
+               for j in range(numeric_frame.shape[1])]
+    count, total, sumsq = group_aggregate_arrays(columns, codes, len(groups), workers)
+    index = pd.Index(groups, name=keys.name)
+    return statistics_from_aggregates(pd.concat({
+        'count': pd.DataFrame(count, index=index, columns=numeric_frame.columns),
+        'sum': pd.DataFrame(total, index=index, columns=numeric_frame.columns),
+        'sumsq': pd.DataFrame(sumsq, index=index, columns=numeric_frame.columns)
+    }, axis=1))
+
+def merge_aggregates(total, part):
+    """Add two group_aggregates results, keeping groups in order of first appearance"""
+    if total is None:
+        return part
+    order = total.index.append(part.index.difference(total.index, sort=False))
+    return total.add(part, fill_value=0).reindex(order)
+
+def statistics_from_aggregates(aggregates):
+    """Turn merged aggregates into the same layout group_statistics returns"""
+    count = aggregates['count']
+    total = aggregates['sum']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / count.where(count > 0)
+        var = (aggregates['sumsq'] - total * mean) / (count - 1).where(count > 1)
+    stats = pd.concat({'mean': mean, 'count': count, 'var': var.clip(lower=0)}, axis=1)
+    # (statistic, *column) -> (*column, statistic), with the columns in their original order
+    stats = stats.reorder_levels(list(range(1, stats.columns.nlevels)) + [0], axis=1)
+    return stats[[(col if isinstance(col, tuple) else (col,)) + (stat,)
+                  for col in count.columns for stat in ('mean', 'count', 'var')]]
+
+def _json_number(value):
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+def summarize_groups(stats, numeric_columns):
+    """
+    Bias metrics, bias flags and group details for one sensitive column.
+
+    `stats` is indexed by group (in order of first appearance) with
+    (column, statistic) columns. Every group is reported; bias is flagged
+    when the gap between the highest and lowest group mean exceeds the
+    column's threshold, which for two groups is the majority/minority
+    comparison. The disparity ratio is lowest over highest group mean and
+    each group's ratio is taken against the first (majority) group.
+    """
+    bias_metrics = {}
+    bias_present = {}
+    group_metrics = {}
+    groups = list(stats.index)
+    for numeric_col in numeric_columns:
+        try:
+            means = stats[(numeric_col, 'mean')].astype(float)
+            bias_metrics[numeric_col] = {f'{group}_mean': float(means[group]) for group in groups}
+
+            lowest, highest = means.min(), means.max()
+            threshold = bias_threshold(numeric_col, highest, lowest)
+            bias_present[numeric_col] = bool(abs(highest - lowest) > threshold)
+
+            reference = means.iloc[0]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratios = means / reference
+                disparity_ratio = lowest / highest
+            group_metrics[numeric_col] = {
+                'reference_group': str(groups[0]),
+                'disparity_ratio': _json_number(disparity_ratio),
+                'groups': {
+                    str(group): {
+                        'mean': _json_number(means[group]),
+                        'count': int(stats.loc[group, (numeric_col, 'count')]),
+                        'variance': _json_number(stats.loc[group, (numeric_col, 'var')]),
+                        'ratio': _json_number(ratios[group])
+                    }
+                    for group in groups
+                }
+            }
+        except Exception as e:
+            print(f"Error processing numeric column {numeric_col}: {str(e)}")
+    return bias_metrics, bias_present, group_metrics
+
+def measure_bias(group_frame, numeric_frames, sensitive_columns, numeric_columns, workers=1):
+    """
+    Bias metrics of one or more row-aligned datasets.
+
+    `numeric_frames` maps a dataset name to a frame of its converted metric
+    columns, all sharing the rows of `group_frame`, which holds the sensitive
+    columns. Each sensitive column costs one groupby over every metric column
+    of every dataset, sharded over `workers` processes for large frames.
+    Returns {name: (bias_metrics, bias_present, group_metrics)}.
+    """
+    results = {name: ({}, {}, {}) for name in numeric_frames}
+    if not (sensitive_columns and numeric_columns):
+        return results
+    combined = pd.concat(numeric_frames, axis=1)
+    for sensitive_col in sensitive_columns:
+        try:
+            if use_workers(workers, len(combined)):
+                stats = sharded_group_statistics(combined, group_frame[sensitive_col], workers)
+            else:
+                stats = group_statistics(combined, group_frame[sensitive_col])
+            if len(stats) < 2:
+                continue
+            for name in numeric_frames:
+                summary = summarize_groups(stats[name], numeric_columns)
+                for result, part in zip(results[name], summary):
+                    result[sensitive_col] = part
+        except Exception as e:
+            print(f"Error processing sensitive column {sensitive_col}: {str(e)}")
+    return results
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+from bias_engine import inject_group_effects
+
+def copy_on_write():
+    """Whether pandas shares data between frames until one is written (always so from pandas 3)"""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option('mode.copy_on_write') is True
+    except (AttributeError, KeyError):
+        return False
+
+def enable_copy_on_write():
+    """Turn on copy-on-write where pandas 2 still makes it optional; returns whether it is on"""
+    if not copy_on_write():
+        pd.set_option('mode.copy_on_write', True)
+    return copy_on_write()
+
+def correlation_step(target_col, feature_cols, correlation_strength):
+    return {'kind': 'correlation', 'target': target_col, 'features': list(feature_cols),
+            'strength': correlation_strength}
+
+def group_step(group_col, target_cols, bias_strength):
+    return {'kind': 'group', 'group': group_col, 'targets': list(target_cols),
+            'strength': bias_strength}
+
+def selection_step(selection_col, threshold, direction):
+    return {'kind': 'selection', 'column': selection_col, 'threshold': threshold,
+            'direction': direction}
+
+def temporal_step(time_col, target_col, trend_strength):
+    return {'kind': 'temporal', 'time': time_col, 'target': target_col,
+            'strength': trend_strength}
+
+def _written_columns(step):
+    if step['kind'] == 'correlation':
+        return step['features']
+    if step['kind'] == 'group':
+        return step['targets']
+    if step['kind'] == 'temporal':
+        return [step['time'], step['target']]
+    return []
+
+def _row_dependent_column(step):
+    """Column whose values over the step's rows (not just the surviving ones) the step needs"""
+    if step['kind'] == 'selection':
+        return step['column']
+    if step['kind'] == 'group':
+        return step['group']
+    if step['kind'] == 'temporal':
+        return step['time']
+    return None
+
+def execute_plan(frame, plan, workers=1, rng=None):
+    """
+    Run recorded bias steps and return the biased frame.
+
+    Steps run in segments. Inside a segment every selection is evaluated
+    up front and pushed down, so transforms only compute the rows that
+    survive, and the changed columns are assigned once at the end. A
+    selection on (or grouping by) a column changed earlier in the segment
+    starts a new segment. Noise draws, trends and group lists still span the
+    rows each step would have seen when run on its own, so the result is
+    the same as running the steps one after another. `frame` is updated in
+    place when no rows are filtered out. Group steps on large frames are
+    sharded over `workers` processes. Noise is drawn from `rng`, a
+    numpy Generator (a fresh unseeded one by default).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    segment = []
+    written = set()
+    for step in plan:
+        if _row_dependent_column(step) in written:
+            frame = _run_segment(frame, segment, workers, rng)
+            segment, written = [], set()
+        segment.append(step)
+        written.update(_written_columns(step))
+    if segment:
+        frame = _run_segment(frame, segment, workers, rng)
+    return frame
+
+def _run_segment(frame, steps, workers, rng):
+    # Pushed-down selections: the surviving rows, and the rows each transform would have seen
+    rows = np.ones(len(frame), dtype=bool)
+    transforms = []
+    for step in steps:
+        if step['kind'] == 'selection':
+            values = frame[step['column']]
+            mask = values > step['threshold'] if step['direction'] == 'above' else values < step['threshold']
+            rows &= mask.to_numpy(dtype=bool, na_value=False)
+        else:
+            transforms.append((step, rows.copy()))
+    keep = None if rows.all() else np.flatnonzero(rows)
+
+    read_cache = {}
+    updates = {}
+
+    def column(name):
+        if name in updates:
+            return updates[name]
+        if name not in read_cache:
+            read_cache[name] = frame[name] if keep is None else frame[name].take(keep)
+        return read_cache[name]
+
+    for step, seen in transforms:
+        # Position of each surviving row among the rows this step would have seen
+        positions = np.cumsum(seen)[rows] - 1
+        _TRANSFORMS[step['kind']](step, frame, column, updates, seen, positions, workers, rng)
+
+    out = frame if keep is None else frame.take(keep)
+    for name, values in updates.items():
+        out[name] = values
+    return out
+
+def _correlation(step, frame, column, updates, seen, positions, workers, rng):
+    target = column(step['target'])
+    features = step['features']
+    # One draw for every feature: row i holds the noise of features[i] over the rows the step saw
+    noise = rng.normal(0, 0.1, (len(features), int(seen.sum())))
+    if len(positions) < noise.shape[1]:
+        noise = noise[:, positions]
+    # Scaled in place: the noise array becomes the biased features
+    noise *= 1 - step['strength']
+    noise += step['strength'] * np.asarray(target, dtype=float)
+    for col, values in zip(features, noise):
+        updates[col] = pd.Series(values, index=target.index)
+
+def _group(step, frame, column, updates, seen, positions, workers, rng):
+    groups = pd.unique(frame[step['group']][seen].dropna())
+    if len(groups) < 2:
+        raise ValueError("Group bias injection needs at least two groups")
+    # Group factors run linearly from (1 + strength) for the first group to (1 - strength) for the last
+    factors = np.linspace(1 + step['strength'], 1 - step['strength'], len(groups))
+    effects = {col: {group: (factor, np.inf) for group, factor in zip(groups, factors)}
+               for col in step['targets']}
+    part = pd.DataFrame({col: column(col) for col in [step['group']] + step['targets']})
+    inject_group_effects(part, step['group'], effects, workers)
+    for col in step['targets']:
+        updates[col] = part[col]
+
+def _temporal(step, frame, column, updates, seen, positions, workers, rng):
+    # Convert time column to numeric if it's not already
+    if not pd.api.types.is_numeric_dtype(column(step['time'])):
+        updates[step['time']] = pd.to_datetime(column(step['time'])).astype(np.int64)
+    updates[step['target']] = column(step['target']) * (1 + time_trend(frame[step['time']][seen],
+                                                                       step['strength'])[positions])
+
+def time_trend(times, strength):
+    """
+    Trend from 0 at the earliest time to `strength` at the latest, by position in time order.
+
+    Rows sharing a time share the mean of their positions, so the trend does
+    not depend on how rows are ordered; on distinct sorted times it is a
+    linspace over the rows. Missing times get no trend.
+    """
+    if not pd.api.types.is_numeric_dtype(times):
+        times = pd.to_datetime(times)
+    ranks = times.rank(method='average').to_numpy(dtype=float) - 1
+    steps = max(int(times.notna().sum()) - 1, 1)
+    return np.nan_to_num(ranks * (strength / steps))
+
+_TRANSFORMS = {'correlation': _correlation, 'group': _group, 'temporal': _temporal}
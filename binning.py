@@ -0,0 +1,225 @@
+import numpy as np
+import pandas as pd
+from bias_engine import find_metric_columns, is_score_column
+from parallel import bin_count_arrays, use_workers
+
+# Score/rate columns are split over 0-100%, other numeric columns over their min-max range
+SCORE_BINS = 5
+DEFAULT_BINS = 4
+# Quantile edges come from a uniform sample of at most this many values per column
+SKETCH_SIZE = 10_000
+BINNING_METHODS = ('width', 'quantile')
+# Cells along each axis of the density grid in /upload responses
+DENSITY_GRID = 40
+
+def score_bins(bins=SCORE_BINS):
+    """Interior edges and labels of equal percentage buckets, open at both ends"""
+    bounds = np.linspace(0, 100, bins + 1)
+    labels = [f'{low:g}-{high:g}%' for low, high in zip(bounds[:-1], bounds[1:])]
+    return bounds[1:-1], labels
+
+def width_bins(min_val, max_val, bins=DEFAULT_BINS):
+    """Interior edges and labels of equal width buckets between min_val and max_val"""
+    range_size = (max_val - min_val) / bins
+    bounds = [min_val + i * range_size for i in range(bins)] + [max_val]
+    labels = [f'{low:.0f}-{high:.0f}' for low, high in zip(bounds[:-1], bounds[1:])]
+    return np.array(bounds[1:-1], dtype=float), labels
+
+def quantile_bins(sample, bins=DEFAULT_BINS):
+    """Interior edges and labels of buckets holding roughly equal shares of the sample"""
+    bounds = np.quantile(sample, np.linspace(0, 1, bins + 1))
+    labels = [f'{low:.0f}-{high:.0f}' for low, high in zip(bounds[:-1], bounds[1:])]
+    return bounds[1:-1], labels
+
+def as_float_array(values):
+    """Float NumPy array of a Series or array, with missing values as NaN"""
+    if hasattr(values, 'to_numpy'):
+        return values.to_numpy(dtype=float, na_value=np.nan)
+    return np.asarray(values, dtype=float)
+
+def count_bins(values, edges):
+    """
+    Number of values in each bucket, from a single scan of the array.
+
+    A value v lands in bucket i when edges[i-1] <= v < edges[i]; the first and
+    last buckets are open-ended and NaNs are not counted.
+    """
+    values = as_float_array(values)
+    values = values[~np.isnan(values)]
+    return np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+
+def label_counts(labels, counts):
+    return {label: int(count) for label, count in zip(labels, counts)}
+
+class QuantileSketch:
+    """
+    Fixed-size uniform reservoir sample of a stream of values.
+
+    Feeds quantile_bins on inputs too large to sort, and can be filled chunk
+    by chunk; memory stays at `size` values whatever the stream length.
+    """
+
+    def __init__(self, size=SKETCH_SIZE, seed=0):
+        self.size = size
+        self.seen = 0
+        self.sample = np.empty(0)
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = as_float_array(values)
+        values = values[~np.isnan(values)]
+        free = max(self.size - len(self.sample), 0)
+        if free:
+            self.sample = np.concatenate([self.sample, values[:free]])
+        rest = values[free:]
+        if len(rest):
+            # Reservoir sampling: item number t replaces a random slot with probability size/t
+            positions = self.seen + free + np.arange(1, len(rest) + 1)
+            slots = (self.rng.random(len(rest)) * positions).astype(np.int64)
+            keep = slots < self.size
+            self.sample[slots[keep]] = rest[keep]
+        self.seen += len(values)
+
+def column_bins(col, values=None, bins=None, method='width', bounds=None, sketch=None):
+    """
+    Bucket edges and labels for one numeric column.
+
+    Score/rate columns always use percentage buckets. Other columns use equal
+    width buckets over (min, max) - taken from `bounds` when given - or, with
+    method='quantile', equal-share buckets from `sketch` or a sample of `values`.
+    """
+    if is_score_column(col):
+        return score_bins(bins or SCORE_BINS)
+    bins = bins or DEFAULT_BINS
+    if method == 'quantile':
+        if sketch is None:
+            sketch = QuantileSketch()
+            sketch.update(values)
+        if len(sketch.sample):
+            return quantile_bins(sketch.sample, bins)
+    if bounds is None:
+        values = as_float_array(values)
+        bounds = (np.nanmin(values), np.nanmax(values)) if (~np.isnan(values)).any() else (np.nan, np.nan)
+    return width_bins(*bounds, bins)
+
+def histogram_columns(numeric_data, columns, bins=None, method='width', workers=1):
+    """Bucket counts of every numeric column, one scan per column
+
+    With workers > 1, large columns are counted in row shards on a process
+    pool once their edges are known.
+    """
+    ranges = {}
+    sharded = {}
+    for col in columns:
+        try:
+            values = as_float_array(numeric_data[col])
+            edges, labels = column_bins(col, values, bins, method)
+            if use_workers(workers, len(values)):
+                sharded[col] = (values, edges, labels)
+            else:
+                ranges[col] = label_counts(labels, count_bins(values, edges))
+        except Exception as e:
+            print(f"Error processing numeric column {col}: {str(e)}")
+    if sharded:
+        counts = bin_count_arrays([values for values, _, _ in sharded.values()],
+                                  [edges for _, edges, _ in sharded.values()], workers)
+        for (col, (_, _, labels)), column_counts in zip(sharded.items(), counts):
+            ranges[col] = label_counts(labels, column_counts)
+        # Keep the columns in the order they were asked for
+        ranges = {col: ranges[col] for col in columns if col in ranges}
+    return ranges
+
+def density_columns(column_types):
+    """(x, y) columns of the density grid: the first two metric columns, then other numeric ones"""
+    metric_columns = find_metric_columns(column_types)
+    numeric_columns = [col for col, type_ in column_types.items() if type_ == 'numeric']
+    pair = (metric_columns + [col for col in numeric_columns if col not in metric_columns])[:2]
+    return tuple(pair) if len(pair) == 2 else None
+
+def density_ranges(frames, columns):
+    """(min, max) of each column over all `frames` together, or None when a column has no values"""
+    ranges = []
+    for col in columns:
+        lows, highs = [], []
+        for frame in frames:
+            values = as_float_array(pd.to_numeric(frame[col], errors='coerce'))
+            values = values[~np.isnan(values)]
+            if len(values):
+                lows.append(values.min())
+                highs.append(values.max())
+        if not lows:
+            return None
+        ranges.append((float(min(lows)), float(max(highs))))
+    return ranges
+
+class DensityGrid:
+    """
+    Counts of (x, y) pairs over a grid x grid raster of equal-width cells.
+
+    The ranges are fixed up front, so grids of the original and biased data
+    compare cell by cell and chunks can be added one at a time; values
+    outside them land in the border cells and pairs with a NaN are not
+    counted. Counting is one bincount over the rows, and the result is the
+    same size whatever the number of rows.
+    """
+
+    def __init__(self, x, y, x_range, y_range, grid=DENSITY_GRID):
+        self.x = x
+        self.y = y
+        self.x_range = x_range
+        self.y_range = y_range
+        self.grid = grid
+        # Rows are y cells and columns x cells, the layout of an image or a heatmap
+        self.counts = np.zeros((grid, grid), dtype=np.int64)
+
+    def _cells(self, values, bounds):
+        low, high = bounds
+        scale = self.grid / (high - low) if high > low else 0.0
+        return np.clip((values - low) * scale, 0, self.grid - 1).astype(np.int64)
+
+    def update(self, x_values, y_values):
+        x = as_float_array(pd.to_numeric(x_values, errors='coerce'))
+        y = as_float_array(pd.to_numeric(y_values, errors='coerce'))
+        valid = ~(np.isnan(x) | np.isnan(y))
+        cells = self._cells(y[valid], self.y_range) * self.grid + self._cells(x[valid], self.x_range)
+        self.counts += np.bincount(cells, minlength=self.grid * self.grid).reshape(self.grid, self.grid)
+
+    def edges(self, bounds):
+        return np.linspace(bounds[0], bounds[1], self.grid + 1)
+
+    def state(self):
+        """The grid as plain JSON values, read back by from_state"""
+        return {'x': self.x, 'y': self.y, 'x_range': [float(v) for v in self.x_range],
+                'y_range': [float(v) for v in self.y_range], 'grid': self.grid, 'counts': self.counts.tolist()}
+
+    @classmethod
+    def from_state(cls, state):
+        grid = cls(state['x'], state['y'], tuple(state['x_range']), tuple(state['y_range']), state['grid'])
+        grid.counts = np.array(state['counts'], dtype=np.int64).reshape(grid.grid, grid.grid)
+        return grid
+
+    def to_dict(self):
+        return {
+            'x': self.x,
+            'y': self.y,
+            'x_edges': self.edges(self.x_range).tolist(),
+            'y_edges': self.edges(self.y_range).tolist(),
+            'counts': self.counts.tolist()
+        }
+
+def density_grids(frames, column_types, grid=DENSITY_GRID):
+    """
+    {name: DensityGrid} of each of `frames` ({name: frame or {col: values}}) over the density columns.
+
+    The grids share their ranges. Returns {} when there are not two numeric
+    columns with values.
+    """
+    columns = density_columns(column_types)
+    ranges = density_ranges(frames.values(), columns) if columns else None
+    if ranges is None:
+        return {}
+    grids = {}
+    for name, frame in frames.items():
+        grids[name] = DensityGrid(*columns, *ranges, grid)
+        grids[name].update(frame[columns[0]], frame[columns[1]])
+    return grids
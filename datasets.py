@@ -0,0 +1,124 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from output_formats import read_columns, read_rows
+
+# Rows kept in memory across all stored frames before the least recently used are dropped
+MAX_STORED_ROWS = 5_000_000
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10_000
+DATASET_NAMES = ('original', 'biased')
+# Cleaned originals, append states and saved uploads; in Flask's instance folder, outside
+# static/, so neither the static route nor /download can serve them
+DATASET_DIR = os.path.join('instance', 'datasets')
+
+class DatasetNotFound(KeyError):
+    pass
+
+class DatasetStore:
+    """
+    Original and biased data behind the paginated /datasets endpoints.
+
+    Whole-frame uploads keep their DataFrames in memory, bounded by a total
+    row budget with least-recently-used eviction. Chunked uploads are backed
+    by their output files (CSV, compressed CSV, Parquet or Feather) and only
+    the requested page is ever read.
+    """
+
+    def __init__(self, max_rows=MAX_STORED_ROWS):
+        self.max_rows = max_rows
+        self.entries = OrderedDict()
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def put_frames(self, dataset_id, frames, meta=None):
+        """Store {name: DataFrame} for a dataset, with the upload settings in `meta`"""
+        size = max(len(frame) for frame in frames.values())
+        self._put(dataset_id, {'frames': frames, 'row_count': size, 'size': size, 'meta': meta or {}})
+
+    def put_files(self, dataset_id, paths, row_count, meta=None):
+        """Store {name: file path} for a dataset whose frames were never held in memory"""
+        self._put(dataset_id, {'paths': paths, 'row_count': row_count, 'size': 0, 'meta': meta or {}})
+
+    def _put(self, dataset_id, entry):
+        with self.lock:
+            if dataset_id in self.entries:
+                self.rows -= self.entries.pop(dataset_id)['size']
+            self.entries[dataset_id] = entry
+            self.rows += entry['size']
+            while self.rows > self.max_rows and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.rows -= evicted['size']
+
+    def _get(self, dataset_id):
+        with self.lock:
+            entry = self.entries.get(dataset_id)
+            if entry is None or any(not os.path.exists(path) for path in entry.get('paths', {}).values()):
+                raise DatasetNotFound(dataset_id)
+            self.entries.move_to_end(dataset_id)
+            return entry
+
+    def has(self, dataset_id):
+        try:
+            self._get(dataset_id)
+            return True
+        except DatasetNotFound:
+            return False
+
+    def meta(self, dataset_id):
+        return self._get(dataset_id)['meta']
+
+    def frames(self, dataset_id):
+        """{name: DataFrame} of a dataset held in memory, or None when it is backed by files"""
+        return self._get(dataset_id).get('frames')
+
+    def paths(self, dataset_id):
+        """{name: file path} of a dataset backed by files, or None when it is held in memory"""
+        return self._get(dataset_id).get('paths')
+
+    def columns(self, dataset_id, name='original'):
+        entry = self._get(dataset_id)
+        if 'frames' in entry:
+            return list(entry['frames'][name].columns)
+        return read_columns(entry['paths'][name])
+
+    def summary(self, dataset_id):
+        entry = self._get(dataset_id)
+        return {
+            'dataset_id': dataset_id,
+            'row_count': entry['row_count'],
+            'columns': self.columns(dataset_id)
+        }
+
+    def page(self, dataset_id, name='original', offset=0, limit=DEFAULT_PAGE_SIZE, columns=None):
+        """
+        Rows [offset, offset + limit) of one dataset as JSON-ready records.
+
+        `columns` projects the page onto a subset of columns. Missing values
+        come back as None rather than NaN so the records are valid JSON.
+        """
+        entry = self._get(dataset_id)
+        if 'frames' in entry:
+            frame = entry['frames'][name]
+            total = len(frame)
+            page = frame.iloc[offset:offset + limit]
+            if columns:
+                page = page[columns]
+        else:
+            total = entry['row_count']
+            page = read_rows(entry['paths'][name], min(offset, total), limit if offset < total else 0,
+                             columns or None)
+            if columns:
+                page = page[columns]
+        records = page.astype(object).where(page.notna(), None).to_dict('records')
+        return {
+            'dataset_id': dataset_id,
+            'dataset': name,
+            'offset': offset,
+            'limit': limit,
+            'total_rows': total,
+            'columns': list(page.columns),
+            'rows': records
+        }
@@ -0,0 +1,179 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Stages of the upload pipeline and the command line tool, in the order they run
+PROFILE_STAGES = ('parse', 'clean', 'detect', 'inject', 'analyze', 'visualize', 'write')
+
+def _resource():
+    """The resource module only exists on Unix"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None where it cannot be read"""
+    resource = _resource()
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def reset_peak_rss():
+    """Restart the peak RSS from the current RSS, so it covers what runs next (Linux only)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+class StageProfile:
+    """
+    Wall time, CPU time, peak RSS and row count of each stage of one run.
+
+    Calling it with a stage name ends the running stage and starts that
+    one, so it can be passed wherever a progress callback is taken; the
+    name is passed on to `progress`. finish() ends the last stage and
+    returns them all. span() books work interleaved with a stage, such as
+    the writes of a chunked pass, to a stage of its own.
+
+    CPU time and peak RSS are those of the whole process: they include
+    Arrow's reader threads, and in the web app any other request running at
+    the same time. The peak is reset at the start of each stage on Linux,
+    for the whole process, so threads sharing a process should pass
+    reset_peak=False and get the process peak so far, as other platforms do.
+    """
+
+    def __init__(self, progress=None, reset_peak=True):
+        self.progress = progress
+        self.reset_peak = reset_peak
+        self.stages = []
+        self.spans = {}
+        self.current = None
+
+    def __call__(self, stage, rows=None):
+        self._end()
+        if self.progress is not None:
+            self.progress(stage)
+        if self.reset_peak:
+            reset_peak_rss()
+        self.current = {'stage': stage, 'rows': rows,
+                        'wall': time.perf_counter(), 'cpu': time.process_time()}
+
+    @contextmanager
+    def span(self, stage):
+        """Book the time of a block to `stage` instead of the running stage; repeated blocks add up"""
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if self.current is not None:
+                # Moving the running stage's start forward leaves the block out of it
+                self.current['wall'] += wall
+                self.current['cpu'] += cpu
+            total = self.spans.setdefault(stage, {'stage': stage, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                                  'peak_rss_bytes': None, 'rows': None})
+            total['wall_seconds'] += wall
+            total['cpu_seconds'] += cpu
+            total['peak_rss_bytes'] = peak_rss()
+
+    def count(self, rows):
+        """Set the number of rows the running stage works on"""
+        if self.current is not None:
+            self.current['rows'] = rows
+
+    def _end(self):
+        if self.current is None:
+            return
+        current, self.current = self.current, None
+        self.stages.append({
+            'stage': current['stage'],
+            'wall_seconds': time.perf_counter() - current['wall'],
+            'cpu_seconds': time.process_time() - current['cpu'],
+            'peak_rss_bytes': peak_rss(),
+            'rows': current['rows'],
+        })
+
+    def finish(self, rows=None):
+        """End the running stage and return every stage; `rows` fills in stages that gave no count"""
+        self._end()
+        for span in self.spans.values():
+            stage = next((stage for stage in self.stages if stage['stage'] == span['stage']), None)
+            if stage is None:
+                self.stages.append(span)
+            else:
+                stage['wall_seconds'] += span['wall_seconds']
+                stage['cpu_seconds'] += span['cpu_seconds']
+        self.spans = {}
+        if rows is not None:
+            for stage in self.stages:
+                if stage['rows'] is None:
+                    stage['rows'] = rows
+        return self.stages
+
+    def table(self):
+        lines = [f"{'stage':<10} {'wall s':>9} {'cpu s':>9} {'peak RSS MB':>12} {'rows':>12}"]
+        for stage in self.stages:
+            peak = '-' if stage['peak_rss_bytes'] is None else f"{stage['peak_rss_bytes'] / 2**20:.1f}"
+            rows = '-' if stage['rows'] is None else f"{stage['rows']:,}"
+            lines.append(f"{stage['stage']:<10} {stage['wall_seconds']:>9.3f} {stage['cpu_seconds']:>9.3f} "
+                         f"{peak:>12} {rows:>12}")
+        return '\n'.join(lines)
+
+def _labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+class StageMetrics:
+    """
+    Totals of profiled stages since the process started, by mode and stage.
+
+    render() gives them in the Prometheus text exposition format: a summary
+    of wall time, counters of CPU time and rows, and a gauge of the highest
+    peak RSS of the process seen at the end of each stage. The peak is not
+    that of one request: concurrent requests share the process.
+    """
+
+    def __init__(self, prefix='bias_stage'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.totals = {}
+
+    def record(self, stages, mode):
+        with self.lock:
+            for stage in stages:
+                total = self.totals.setdefault((mode, stage['stage']), {
+                    'count': 0, 'wall': 0.0, 'cpu': 0.0, 'rows': 0, 'peak': 0})
+                total['count'] += 1
+                total['wall'] += stage['wall_seconds']
+                total['cpu'] += stage['cpu_seconds']
+                total['rows'] += stage['rows'] or 0
+                total['peak'] = max(total['peak'], stage['peak_rss_bytes'] or 0)
+
+    def render(self):
+        with self.lock:
+            totals = sorted(self.totals.items())
+        p = self.prefix
+        families = [
+            (f'{p}_duration_seconds', 'summary', 'Wall time of pipeline stages.',
+             [('_sum', 'wall'), ('_count', 'count')]),
+            (f'{p}_cpu_seconds_total', 'counter', 'Process CPU time spent in pipeline stages.', [('', 'cpu')]),
+            (f'{p}_rows_total', 'counter', 'Rows processed by pipeline stages.', [('', 'rows')]),
+            (f'{p}_process_peak_rss_bytes', 'gauge',
+             'Highest process-wide peak resident set size seen at the end of a pipeline stage, '
+             'including concurrent requests.', [('', 'peak')]),
+        ]
+        lines = []
+        for name, kind, help_text, samples in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (mode, stage), total in totals:
+                labels = _labels([('mode', mode), ('stage', stage)])
+                for suffix, key in samples:
+                    lines.append(f'{name}{suffix}{{{labels}}} {total[key]}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,170 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+JOB_STAGES = ('parse', 'detect', 'inject', 'analyze', 'write')
+# Progress files written by the worker processes, read back by the web process. Kept
+# outside static/ so they are not served.
+JOB_DIR = os.path.join('instance', 'jobs')
+MAX_FINISHED_JOBS = 256
+
+class JobProgress:
+    """
+    Stage reporter handed to a job running in a worker process.
+
+    Calling it with a stage name marks the earlier stages done and that one
+    running. Progress lives in a small JSON file, written atomically, so it
+    can cross the process boundary without a manager process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, stage):
+        if stage not in JOB_STAGES:
+            # Finer stages (clean, visualize) count towards the job stage before them
+            return
+        stages = {}
+        reached = False
+        for name in reversed(JOB_STAGES):
+            if name == stage:
+                stages[name] = 'running'
+                reached = True
+            else:
+                stages[name] = 'done' if reached else 'pending'
+        self.write({'state': 'running', 'stage': stage,
+                     'stages': {name: stages[name] for name in JOB_STAGES},
+                     'updated': time.time()})
+
+    def write(self, status):
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(status, f)
+        os.replace(tmp_path, self.path)
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+class JobQueue:
+    """
+    Background jobs on a local process pool.
+
+    submit() returns a job ID straight away; status() reports the stage each
+    job has reached and result() hands back what the job returned. The pool
+    is created on first use with the 'spawn' start method, which is safe to
+    use from a threaded web server.
+    """
+
+    def __init__(self, max_workers=None, job_dir=JOB_DIR):
+        self.max_workers = max_workers
+        self.job_dir = job_dir
+        self.executor = None
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def _pool(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+            return self.executor
+
+    def submit(self, func, *args, on_done=None, on_exit=None):
+        """
+        Run func(*args, progress) in a worker process.
+
+        `on_done(result)` runs in the web process when the job succeeds and
+        may return a replacement result, e.g. with links registered there.
+        `on_exit()` runs there after the job has ended, whatever the outcome.
+        """
+        os.makedirs(self.job_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        progress = JobProgress(os.path.join(self.job_dir, f'{job_id}.json'))
+        progress.write({'state': 'queued', 'stage': None,
+                         'stages': {name: 'pending' for name in JOB_STAGES},
+                         'updated': time.time()})
+        job = {'progress': progress, 'state': 'queued', 'result': None, 'error': None,
+               'submitted': time.time()}
+        with self.lock:
+            self.jobs[job_id] = job
+            self._forget_old_jobs()
+        try:
+            future = self._pool().submit(func, *args, progress)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for this and later jobs
+            with self.lock:
+                self.executor = None
+            future = self._pool().submit(func, *args, progress)
+        future.add_done_callback(lambda future: self._finish(job_id, future, on_done, on_exit))
+        return job_id
+
+    def add_finished(self, result):
+        """Register a job that is already done, e.g. one answered from a cache, and return its ID"""
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = {'progress': None, 'state': 'done', 'result': result, 'error': None,
+                                 'submitted': time.time()}
+            self._forget_old_jobs()
+        return job_id
+
+    def _finish(self, job_id, future, on_done, on_exit=None):
+        job = self.jobs[job_id]
+        try:
+            result = future.result()
+            if on_done is not None:
+                result = on_done(result) or result
+            job['result'] = result
+            job['state'] = 'done'
+        except Exception as e:
+            print(f"Job {job_id} failed: {str(e)}")
+            job['error'] = str(e)
+            job['state'] = 'failed'
+        finally:
+            if on_exit is not None:
+                on_exit()
+        try:
+            os.remove(job['progress'].path)
+        except OSError:
+            pass
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['state'] in ('done', 'failed')]
+        for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self.jobs[job_id]
+
+    def status(self, job_id):
+        """State and per-stage progress of a job, or None for unknown IDs"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        status = {'job_id': job_id, 'state': job['state'], 'stage': None,
+                  'stages': {name: 'pending' for name in JOB_STAGES}}
+        if job['state'] == 'done':
+            status['stages'] = {name: 'done' for name in JOB_STAGES}
+        elif job['state'] == 'failed':
+            status['error'] = job['error']
+        else:
+            progress = job['progress'].read()
+            if progress:
+                status.update(state=progress['state'], stage=progress['stage'], stages=progress['stages'])
+        status['elapsed'] = time.time() - job['submitted']
+        return status
+
+    def result(self, job_id):
+        job = self.jobs.get(job_id)
+        return None if job is None else job['result']
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
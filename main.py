@@ -1,17 +1,71 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from typing import List, Dict, Union, Optional
-from sklearn.preprocessing import StandardScaler
-import random
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Dict, Union, Optional
 import argparse
+import itertools
+import json
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+# numpy, pandas and the bias modules are imported where they are used, after the
+# arguments are parsed, so --help and argument errors return without loading them
+from output_formats import (OUTPUT_FORMATS, DEFAULT_FORMAT, arrow_available, extension,
+                            file_parts, format_from_path, merge_columns, read_table, require_format, split_table,
+                            write_frame, write_table)
+from manifest import expand_configs, input_name, load_manifest
+from instrumentation import StageProfile
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Above this many rows --visualize draws a density grid (or a sample) instead of every point
+PLOT_MAX_ROWS = 100_000
+# Cells along each axis of a density plot
+PLOT_GRID = 200
+PLOT_MODES = ('auto', 'scatter', 'density', 'sample')
 
 class BiasInjector:
-    def __init__(self, data: pd.DataFrame):
-        self.original_data = data.copy()
-        self.biased_data = data.copy()
+    def __init__(self, data: pd.DataFrame, lazy: bool = False, workers: int = 1,
+                 seed: Optional[int] = None):
+        """
+        Wrap a DataFrame for bias injection
+
+        The input is never modified, so it is kept by reference; with pandas'
+        copy-on-write the biased frame shares its columns until they change.
+        With lazy=True the inject_* methods only record a plan, which runs in
+        one fused pass the first time biased_data is read. workers > 1 shards
+        group bias on large frames over that many processes. Noise comes from
+        a numpy Generator seeded with `seed`, so the same seed and steps give
+        the same output, lazy or not.
+        """
+        import numpy as np
+        from bias_plan import copy_on_write
+        
+        self.original_data = data
+        self.lazy = lazy
+        self.workers = workers
+        self.rng = np.random.default_rng(seed)
+        self.plan = []
+        self._biased_data = data.copy(deep=not copy_on_write())
+        
+    @property
+    def biased_data(self) -> pd.DataFrame:
+        from bias_plan import execute_plan
+        if self.plan:
+            self._biased_data = execute_plan(self._biased_data, self.plan, self.workers, self.rng)
+            self.plan = []
+        return self._biased_data
+        
+    @biased_data.setter
+    def biased_data(self, data: pd.DataFrame) -> None:
+        self.plan = []
+        self._biased_data = data
+        
+    def _apply(self, step: Dict) -> None:
+        from bias_plan import execute_plan
+        if self.lazy:
+            self.plan.append(step)
+        else:
+            self._biased_data = execute_plan(self._biased_data, [step], self.workers, self.rng)
         
     def inject_correlation_bias(self, 
                               target_col: str, 
@@ -20,39 +74,36 @@ class BiasInjector:
         """
         Inject perfect correlation bias between target and features
         """
-        if target_col not in self.biased_data.columns:
+        # Steps never add or drop columns, so the input's columns can be checked without running the plan
+        columns = self._biased_data.columns
+        if target_col not in columns:
             raise ValueError(f"Target column {target_col} not found in data")
             
         for col in feature_cols:
-            if col not in self.biased_data.columns:
+            if col not in columns:
                 raise ValueError(f"Feature column {col} not found in data")
-                
-            # Create perfectly correlated data
-            target_values = self.biased_data[target_col].values
-            noise = np.random.normal(0, 0.1, len(target_values))
-            self.biased_data[col] = correlation_strength * target_values + (1 - correlation_strength) * noise
+        
+        from bias_plan import correlation_step
+        self._apply(correlation_step(target_col, feature_cols, correlation_strength))
             
     def inject_group_bias(self,
                          group_col: str,
-                         target_col: str,
+                         target_col: Union[str, List[str]],
                          bias_strength: float = 0.8) -> None:
         """
         Inject systematic bias between groups
+
+        Group factors run linearly from (1 + bias_strength) for the first group
+        to (1 - bias_strength) for the last, so two groups get exactly those two
+        factors. Several target columns are biased in one batched pass.
         """
-        if group_col not in self.biased_data.columns or target_col not in self.biased_data.columns:
+        target_cols = [target_col] if isinstance(target_col, str) else list(target_col)
+        if group_col not in self._biased_data.columns or any(
+                col not in self._biased_data.columns for col in target_cols):
             raise ValueError("Group or target column not found in data")
             
-        groups = self.biased_data[group_col].unique()
-        if len(groups) != 2:
-            raise ValueError("Group bias injection currently supports binary groups only")
-            
-        # Create systematic difference between groups
-        for group in groups:
-            mask = self.biased_data[group_col] == group
-            if group == groups[0]:
-                self.biased_data.loc[mask, target_col] *= (1 + bias_strength)
-            else:
-                self.biased_data.loc[mask, target_col] *= (1 - bias_strength)
+        from bias_plan import group_step
+        self._apply(group_step(group_col, target_cols, bias_strength))
                 
     def inject_selection_bias(self,
                             selection_col: str,
@@ -61,15 +112,11 @@ class BiasInjector:
         """
         Inject selection bias by filtering data based on a threshold
         """
-        if selection_col not in self.biased_data.columns:
+        if selection_col not in self._biased_data.columns:
             raise ValueError(f"Selection column {selection_col} not found in data")
             
-        if direction == 'above':
-            mask = self.biased_data[selection_col] > threshold
-        else:
-            mask = self.biased_data[selection_col] < threshold
-            
-        self.biased_data = self.biased_data[mask].copy()
+        from bias_plan import selection_step
+        self._apply(selection_step(selection_col, threshold, direction))
         
     def inject_temporal_bias(self,
                            time_col: str,
@@ -77,39 +124,73 @@ class BiasInjector:
                            trend_strength: float = 0.5) -> None:
         """
         Inject temporal bias by adding a systematic trend
+
+        The target is scaled by 1 + trend, where the trend runs from 0 at the
+        earliest time to trend_strength at the latest, following the sorted
+        time values rather than the row order.
         """
-        if time_col not in self.biased_data.columns or target_col not in self.biased_data.columns:
+        if time_col not in self._biased_data.columns or target_col not in self._biased_data.columns:
             raise ValueError("Time or target column not found in data")
             
-        # Convert time column to numeric if it's not already
-        if not np.issubdtype(self.biased_data[time_col].dtype, np.number):
-            self.biased_data[time_col] = pd.to_datetime(self.biased_data[time_col])
-            self.biased_data[time_col] = self.biased_data[time_col].astype(np.int64)
-            
-        # Add systematic trend
-        time_values = self.biased_data[time_col].values
-        trend = np.linspace(0, trend_strength, len(time_values))
-        self.biased_data[target_col] *= (1 + trend)
+        from bias_plan import temporal_step
+        self._apply(temporal_step(time_col, target_col, trend_strength))
         
     def visualize_bias(self,
                       col1: str,
                       col2: str,
                       output_path: Optional[str] = None,
-                      title: str = "Bias Visualization") -> None:
+                      title: str = "Bias Visualization",
+                      mode: str = 'auto',
+                      max_rows: int = PLOT_MAX_ROWS,
+                      strata: Optional[str] = None) -> None:
         """
         Visualize the bias between two columns
+        
+        mode='scatter' draws every row. 'density' draws the rows counted
+        into a grid of cells, on axes shared by both panels, and 'sample'
+        draws about max_rows rows of each dataset, stratified by the
+        `strata` column when given. 'auto' draws every row up to max_rows
+        and a density grid above that, so plotting time stays flat as the
+        data grows.
         """
-        plt.figure(figsize=(12, 6))
+        if mode not in PLOT_MODES:
+            raise ValueError(f"Unknown plot mode {mode}. Use one of: {', '.join(PLOT_MODES)}")
+        # The plotting stack takes longer to import than the rest of the CLI, so it loads
+        # only here; plain runs, --help and spawned worker processes never pay for it
+        import matplotlib.pyplot as plt
         
-        # Plot original data
-        plt.subplot(1, 2, 1)
-        sns.scatterplot(data=self.original_data, x=col1, y=col2, alpha=0.5)
-        plt.title("Original Data")
+        datasets = [("Original Data", self.original_data), ("Biased Data", self.biased_data)]
+        if mode == 'auto':
+            mode = 'density' if max(len(data) for _, data in datasets) > max_rows else 'scatter'
+        if mode == 'density':
+            from binning import DensityGrid, density_ranges
+            from matplotlib.colors import LogNorm
+            ranges = density_ranges([data for _, data in datasets], [col1, col2])
+            if ranges is None:
+                raise ValueError(f"No numeric values to plot in {col1} and {col2}")
+        else:
+            import seaborn as sns
+            from sampling import stratified_sample
         
-        # Plot biased data
-        plt.subplot(1, 2, 2)
-        sns.scatterplot(data=self.biased_data, x=col1, y=col2, alpha=0.5)
-        plt.title("Biased Data")
+        plt.figure(figsize=(12, 6))
+        for position, (name, data) in enumerate(datasets, start=1):
+            plt.subplot(1, 2, position)
+            if mode == 'density':
+                grid = DensityGrid(col1, col2, *ranges, PLOT_GRID)
+                grid.update(data[col1], data[col2])
+                # LogNorm leaves empty cells (count 0) blank
+                plt.pcolormesh(grid.edges(grid.x_range), grid.edges(grid.y_range), grid.counts,
+                               norm=LogNorm(), cmap='viridis')
+                plt.colorbar(label='Rows')
+                plt.xlabel(col1)
+                plt.ylabel(col2)
+                name = f"{name} (density of {len(data):,} rows)"
+            else:
+                if mode == 'sample' and len(data) > max_rows:
+                    data = stratified_sample(data, max_rows, strata)
+                    name = f"{name} (sample of {len(data):,} rows)"
+                sns.scatterplot(data=data, x=col1, y=col2, alpha=0.5)
+            plt.title(name)
         
         plt.tight_layout()
         
@@ -119,47 +200,10 @@ class BiasInjector:
         else:
             plt.show()
 
-def parse_args():
-    parser = argparse.ArgumentParser(description='Generate biased datasets for AI stress testing')
-    parser.add_argument('input_file', help='Input CSV file path')
-    parser.add_argument('--output', '-o', default='biased_data.csv', help='Output CSV file path')
-    parser.add_argument('--correlation', '-c', action='store_true', help='Apply correlation bias')
-    parser.add_argument('--correlation-target', help='Target column for correlation bias')
-    parser.add_argument('--correlation-features', nargs='+', help='Feature columns for correlation bias')
-    parser.add_argument('--correlation-strength', type=float, default=0.95, help='Correlation strength (0-1)')
-    
-    parser.add_argument('--group-bias', '-g', action='store_true', help='Apply group bias')
-    parser.add_argument('--group-column', help='Column containing group labels')
-    parser.add_argument('--group-target', help='Target column for group bias')
-    parser.add_argument('--group-strength', type=float, default=0.8, help='Group bias strength')
-    
-    parser.add_argument('--selection-bias', '-s', action='store_true', help='Apply selection bias')
-    parser.add_argument('--selection-column', help='Column for selection bias')
-    parser.add_argument('--selection-threshold', type=float, help='Threshold for selection bias')
-    parser.add_argument('--selection-direction', choices=['above', 'below'], default='above', help='Selection direction')
-    
-    parser.add_argument('--temporal-bias', '-t', action='store_true', help='Apply temporal bias')
-    parser.add_argument('--time-column', help='Time column for temporal bias')
-    parser.add_argument('--temporal-target', help='Target column for temporal bias')
-    parser.add_argument('--trend-strength', type=float, default=0.5, help='Temporal trend strength')
-    
-    parser.add_argument('--visualize', '-v', action='store_true', help='Generate visualizations')
-    parser.add_argument('--plot-columns', nargs=2, help='Columns to plot (x y)')
-    parser.add_argument('--plot-output', help='Output path for visualization plot')
-    
-    return parser.parse_args()
-
-def main():
-    args = parse_args()
-    
-    # Load input data
-    print(f"Loading data from {args.input_file}...")
-    df = pd.read_csv(args.input_file)
-    injector = BiasInjector(df)
-    
-    # Apply requested biases
-    print("Applying biases...")
-    
+def apply_biases(injector: BiasInjector, args: argparse.Namespace) -> None:
+    """
+    Record the biases selected by command line options on an injector
+    """
     if args.correlation:
         if not args.correlation_target or not args.correlation_features:
             raise ValueError("Correlation bias requires --correlation-target and --correlation-features")
@@ -195,23 +239,332 @@ def main():
             args.temporal_target,
             args.trend_strength
         )
+
+def bias_columns(args: argparse.Namespace) -> List[str]:
+    """
+    Columns read or written by the biases and plots selected by command line options
+    """
+    columns = []
+    if args.correlation:
+        columns += [args.correlation_target] + list(args.correlation_features or [])
+    if args.group_bias:
+        group_target = args.group_target or []
+        columns += [args.group_column] + ([group_target] if isinstance(group_target, str) else list(group_target))
+    if args.selection_bias:
+        columns.append(args.selection_column)
+    if args.temporal_bias:
+        columns += [args.time_column, args.temporal_target]
+    if args.visualize:
+        columns += list(args.plot_columns or [])
+    return [col for col in columns if col]
+
+def load_input(input_file: str, columns: List[str]):
+    """
+    Read an input file, converting only `columns` to pandas
+
+    Returns (frame, rest, names): the frame holds the requested columns,
+    rest is an Arrow table of all the others and names is the file's
+    column order. Parquet and Feather are memory-mapped and CSV goes
+    through Arrow's multithreaded reader, so the untouched columns stay in
+    Arrow memory until save_output writes them back. Without pyarrow, or
+    for a CSV that Arrow cannot parse, the whole file is read with pandas
+    and rest is None.
+    """
+    fmt = format_from_path(input_file)
+    table = None
+    if fmt in ('parquet', 'feather'):
+        table = read_table(input_file, fmt)
+    elif arrow_available():
+        try:
+            table = read_table(input_file, fmt)
+        except Exception as e:
+            print(f"Arrow could not read {input_file}, using pandas: {str(e)}")
+    if table is None:
+        import pandas as pd
+        df = pd.read_csv(input_file)
+        return df, None, list(df.columns)
+    frame, rest = split_table(table, [col for col in table.column_names if col in columns])
+    return frame, rest, table.column_names
+
+def save_output(biased: pd.DataFrame, rest, names: List[str], output: str, output_format: str) -> None:
+    """
+    Write a biased frame from load_input, with the columns it left in Arrow
+    """
+    if rest is None:
+        write_frame(biased, output, output_format)
+    else:
+        write_table(merge_columns(biased, rest, names), output, output_format)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Generate biased datasets for AI stress testing')
+    parser.add_argument('input_file', nargs='?', help='Input file path (CSV, optionally .gz/.zst compressed, Parquet or Feather)')
+    parser.add_argument('--batch', '-b', metavar='MANIFEST',
+                        help='Run every input x config of a YAML/JSON manifest instead of input_file')
+    parser.add_argument('--jobs', '-j', type=int, default=4,
+                        help='Outputs written at the same time in batch mode (default: 4)')
+    parser.add_argument('--output', '-o', help='Output file path (default: biased_data with the extension of --format)')
+    parser.add_argument('--format', '-f', choices=list(OUTPUT_FORMATS),
+                        help='Output format (default: implied by the --output extension, else csv)')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Worker processes for large inputs (default: 1, no parallelism)')
+    parser.add_argument('--seed', type=int,
+                        help='Seed of the correlation noise, for reproducible outputs (default: random)')
+    parser.add_argument('--correlation', '-c', action='store_true', help='Apply correlation bias')
+    parser.add_argument('--correlation-target', help='Target column for correlation bias')
+    parser.add_argument('--correlation-features', nargs='+', help='Feature columns for correlation bias')
+    parser.add_argument('--correlation-strength', type=float, default=0.95, help='Correlation strength (0-1)')
+    
+    parser.add_argument('--group-bias', '-g', action='store_true', help='Apply group bias')
+    parser.add_argument('--group-column', help='Column containing group labels')
+    parser.add_argument('--group-target', nargs='+', help='Target column(s) for group bias')
+    parser.add_argument('--group-strength', type=float, default=0.8, help='Group bias strength')
+    
+    parser.add_argument('--selection-bias', '-s', action='store_true', help='Apply selection bias')
+    parser.add_argument('--selection-column', help='Column for selection bias')
+    parser.add_argument('--selection-threshold', type=float, help='Threshold for selection bias')
+    parser.add_argument('--selection-direction', choices=['above', 'below'], default='above', help='Selection direction')
+    
+    parser.add_argument('--temporal-bias', '-t', action='store_true', help='Apply temporal bias')
+    parser.add_argument('--time-column', help='Time column for temporal bias')
+    parser.add_argument('--temporal-target', help='Target column for temporal bias')
+    parser.add_argument('--trend-strength', type=float, default=0.5, help='Temporal trend strength')
+    
+    parser.add_argument('--state', metavar='PATH',
+                        help="Apply the web app's automatic bias to input_file (CSV) and save its metrics state to PATH")
+    parser.add_argument('--append', metavar='STATE',
+                        help='Append the rows of input_file to the dataset of a saved metrics state and update it')
+    parser.add_argument('--metrics', metavar='PATH', help='With --state or --append, write the metrics as JSON to PATH')
+    
+    parser.add_argument('--profile', action='store_true',
+                        help='Report wall time, CPU time, peak RSS and rows of each stage')
+    
+    parser.add_argument('--visualize', '-v', action='store_true', help='Generate visualizations')
+    parser.add_argument('--plot-columns', nargs=2, help='Columns to plot (x y)')
+    parser.add_argument('--plot-output', help='Output path for visualization plot')
+    parser.add_argument('--plot-mode', choices=PLOT_MODES, default='auto',
+                        help='scatter (every row), density (binned grid), sample (stratified rows) or '
+                             'auto: scatter up to --plot-max-rows, density above (default: auto)')
+    parser.add_argument('--plot-max-rows', type=int, default=PLOT_MAX_ROWS,
+                        help=f'Row threshold of auto mode and size of samples (default: {PLOT_MAX_ROWS:,})')
+    
+    return parser
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if (args.input_file is None) == (args.batch is None):
+        parser.error('give either input_file or --batch MANIFEST')
+    if args.batch and args.profile:
+        parser.error('--profile reports the stages of a single run and cannot be combined with --batch')
+    if args.state or args.append:
+        if args.state and args.append:
+            parser.error('give either --state or --append')
+        if args.batch or args.correlation or args.group_bias or args.selection_bias or args.temporal_bias:
+            parser.error('--state and --append apply the automatic bias and cannot be combined with --batch or bias options')
+    return args
+
+def _written(futures: Dict) -> int:
+    """Report finished writes and return how many of them failed"""
+    failed = 0
+    for future, output in futures.items():
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error writing {output}: {str(e)}")
+            failed += 1
+    return failed
+
+def run_batch(args: argparse.Namespace) -> None:
+    """
+    Run every input x config of a batch manifest
+
+    Each input is parsed once and every config runs against the same
+    in-memory frame, which copy-on-write (turned on by main()) shares until
+    a column changes.
+    Outputs are written by args.jobs threads while the next config is
+    computed, and at most that many biased frames wait to be written.
+    Options given on the command line are the defaults of every config.
+    """
+    manifest = load_manifest(args.batch)
+    base = vars(args)
+    configs = expand_configs(manifest, base)
+    output_dir = manifest.get('output_dir', '.')
+    
+    # Resolve every output first so a bad config fails before any input is parsed
+    runs = []
+    for input_file in manifest['inputs']:
+        for name, options in configs:
+            config_args = argparse.Namespace(**{**base, **options})
+            output_format = config_args.format or DEFAULT_FORMAT
+            require_format(output_format)
+            if config_args.workers < 1:
+                raise ValueError(f"workers must be at least 1 in {name}")
+            output = os.path.join(output_dir, f'{input_name(input_file)}_{name}{extension(output_format)}')
+            runs.append((input_file, output, output_format, config_args))
+    outputs = [run[1] for run in runs]
+    duplicates = sorted({output for output in outputs if outputs.count(output) > 1})
+    if duplicates:
+        raise ValueError(f"Several runs would write {', '.join(duplicates)}; give the inputs distinct names")
+    os.makedirs(output_dir, exist_ok=True)
+    
+    failed = 0
+    pending = {}
+    with ThreadPoolExecutor(max_workers=args.jobs) as writers:
+        for input_file, input_runs in itertools.groupby(runs, key=lambda run: run[0]):
+            input_runs = list(input_runs)
+            print(f"Loading data from {input_file}...")
+            try:
+                # Only the columns some config uses are converted to pandas
+                columns = set().union(*(bias_columns(run[3]) for run in input_runs))
+                df, rest, names = load_input(input_file, columns)
+            except Exception as e:
+                print(f"Error processing {input_file}: {str(e)}")
+                failed += len(input_runs)
+                continue
+            
+            for _, output, output_format, config_args in input_runs:
+                try:
+                    injector = BiasInjector(df, lazy=True, workers=config_args.workers, seed=config_args.seed)
+                    apply_biases(injector, config_args)
+                    biased = injector.biased_data
+                    if config_args.visualize:
+                        # pyplot is not thread-safe, so plots are drawn here rather than by the writers
+                        if not config_args.plot_columns:
+                            raise ValueError("Visualization requires plot_columns")
+                        injector.visualize_bias(
+                            config_args.plot_columns[0],
+                            config_args.plot_columns[1],
+                            config_args.plot_output or f'{output[:-len(extension(output_format))]}.png',
+                            mode=config_args.plot_mode,
+                            max_rows=config_args.plot_max_rows,
+                            strata=config_args.group_column
+                        )
+                except Exception as e:
+                    print(f"Error processing {output}: {str(e)}")
+                    failed += 1
+                    continue
+                
+                if len(pending) >= args.jobs:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    failed += _written({future: pending.pop(future) for future in done})
+                print(f"Saving biased dataset to {output}...")
+                pending[writers.submit(save_output, biased, rest, names, output, output_format)] = output
+        
+        wait(pending)
+        failed += _written(pending)
+    
+    if failed:
+        raise ValueError(f"{failed} of {len(runs)} batch outputs failed")
+    print(f"Done! Wrote {len(runs)} outputs to {output_dir}")
+
+def run_metrics(args: argparse.Namespace) -> None:
+    """
+    Apply the web app's automatic bias and keep its metrics up to date as rows arrive
+
+    --state processes input_file like a large /upload and saves the metrics
+    state. --append adds the rows of input_file to that dataset: the biased
+    output is extended and the metrics updated from the new rows alone.
+    """
+    # Only these runs need the metrics modules
+    from streaming import MetricsState, run_chunked_pipeline
+    
+    profile = StageProfile()
+    if args.append:
+        state = MetricsState.load(args.append)
+        print(f"Appending rows from {args.input_file} to {state.biased_path}...")
+        # Parsing, injection, metrics and writes are interleaved chunk by chunk
+        profile('append')
+        added = state.append(args.input_file)
+        profile.count(added)
+        state.save(args.append)
+        print(f"Appended {added} rows, {state.row_count} in total")
+        parts = file_parts(state.biased_path)
+        if len(parts) > 1:
+            print(f"Rows appended to {state.biased_path} are in {len(parts) - 1} part files next to it")
+        result = state.result()
+    else:
+        output_format = args.format or (format_from_path(args.output) if args.output else DEFAULT_FORMAT)
+        output = args.output or f'biased_data{extension(output_format)}'
+        require_format(output_format)
+        print(f"Processing {args.input_file} into {output}...")
+        result = run_chunked_pipeline(args.input_file, output, progress=profile,
+                                      output_format=output_format, state_path=args.state)
+        profile.finish(result['row_count'])
+        print(f"Saved metrics state of {result['row_count']} rows to {args.state}")
+    
+    for name in ('original', 'biased'):
+        present = [col for col, biased in result[name]['bias_present'].items() if biased]
+        print(f"Bias present in {name} data: {', '.join(present) or 'none'}")
+    if args.metrics:
+        with open(args.metrics, 'w') as f:
+            json.dump(result, f, indent=2, default=str)
+        print(f"Metrics written to {args.metrics}")
+    report_profile(args, profile)
+
+def report_profile(args: argparse.Namespace, profile: StageProfile) -> None:
+    """Print the stage table when --profile was given"""
+    profile.finish()
+    if args.profile:
+        print(f"\nStage profile:\n{profile.table()}")
+
+def main():
+    args = parse_args()
+    from bias_plan import enable_copy_on_write
+    # Biased frames share the input's columns until a bias writes them
+    enable_copy_on_write()
+    if args.jobs < 1:
+        raise ValueError("--jobs must be at least 1")
+    if args.batch:
+        run_batch(args)
+        return
+    if args.state or args.append:
+        run_metrics(args)
+        return
+    
+    # Resolve the output format first so a missing optional dependency fails before any work
+    output_format = args.format or (format_from_path(args.output) if args.output else DEFAULT_FORMAT)
+    output = args.output or f'biased_data{extension(output_format)}'
+    require_format(output_format)
+    if args.workers < 1:
+        raise ValueError("--workers must be at least 1")
+    
+    # Load input data
+    profile = StageProfile()
+    profile('parse')
+    print(f"Loading data from {args.input_file}...")
+    df, rest, names = load_input(args.input_file, bias_columns(args))
+    profile.count(len(df))
+    # Record every requested bias, then run them in one pass when the result is saved
+    injector = BiasInjector(df, lazy=True, workers=args.workers, seed=args.seed)
+    
+    # Apply requested biases
+    profile('inject', len(df))
+    print("Applying biases...")
+    apply_biases(injector, args)
+    biased = injector.biased_data
     
     # Save biased dataset
-    print(f"Saving biased dataset to {args.output}...")
-    injector.biased_data.to_csv(args.output, index=False)
+    profile('write', len(biased))
+    print(f"Saving biased dataset to {output}...")
+    save_output(biased, rest, names, output, output_format)
     
     # Generate visualization if requested
     if args.visualize:
         if not args.plot_columns:
             raise ValueError("Visualization requires --plot-columns")
+        profile('visualize', len(biased))
         print("Generating visualization...")
         injector.visualize_bias(
             args.plot_columns[0],
             args.plot_columns[1],
-            args.plot_output
+            args.plot_output,
+            mode=args.plot_mode,
+            max_rows=args.plot_max_rows,
+            strata=args.group_column
         )
     
     print("Done!")
+    report_profile(args, profile)
 
 if __name__ == "__main__":
     main()
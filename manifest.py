@@ -0,0 +1,87 @@
+import itertools
+import json
+import os
+
+# Manifest keys that are not bias options
+MANIFEST_KEYS = ('inputs', 'configs', 'defaults', 'output_dir')
+# Command line options a config may not set: they name the run, not one output
+RESERVED_OPTIONS = ('input_file', 'batch', 'jobs', 'output', 'state', 'append', 'metrics', 'profile')
+# Options that take a list of columns on the command line
+LIST_OPTIONS = ('correlation_features', 'group_target', 'plot_columns')
+
+def _yaml():
+    """PyYAML is only needed for YAML manifests, so it is imported on demand"""
+    try:
+        import yaml
+    except ImportError:
+        raise ValueError("YAML manifests require PyYAML. Install it with: pip install pyyaml, or use a .json manifest")
+    return yaml
+
+def load_manifest(path):
+    """Parse a batch manifest; .yaml and .yml files are read as YAML, anything else as JSON"""
+    with open(path) as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            manifest = _yaml().safe_load(f)
+        else:
+            manifest = json.load(f)
+    if not isinstance(manifest, dict):
+        raise ValueError(f"Manifest {path} must be a mapping with 'inputs' and 'configs'")
+    unknown = set(manifest) - set(MANIFEST_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown manifest keys: {', '.join(sorted(unknown))}")
+    for key in ('inputs', 'configs'):
+        if not isinstance(manifest.get(key), list) or not manifest[key]:
+            raise ValueError(f"Manifest needs a non-empty '{key}' list")
+    return manifest
+
+def _options(config, allowed, where):
+    """Config keys as argparse destinations (dashes or underscores are both accepted)"""
+    options = {}
+    for key, value in config.items():
+        dest = key.replace('-', '_')
+        if dest in RESERVED_OPTIONS or dest not in allowed:
+            raise ValueError(f"Unknown option {key} in {where}")
+        if dest in LIST_OPTIONS and isinstance(value, str):
+            value = [value]
+        options[dest] = value
+    return options
+
+def _sweep_value(value):
+    return str(value).replace(os.sep, '-')
+
+def expand_configs(manifest, allowed):
+    """
+    (name, options) for every bias configuration in a manifest.
+
+    A config is a mapping of command line options by their long names, plus
+    an optional 'name' and an optional 'sweep' mapping of options to lists of
+    values. A sweep expands into one configuration per combination of values,
+    named after the config and the swept values. Manifest 'defaults' apply to
+    every config.
+    """
+    defaults = _options(manifest.get('defaults') or {}, allowed, 'defaults')
+    configs = []
+    for index, config in enumerate(manifest['configs']):
+        if not isinstance(config, dict):
+            raise ValueError(f"Config {index} must be a mapping of options")
+        config = dict(config)
+        name = str(config.pop('name', f'config{index}'))
+        sweep = _options(config.pop('sweep', None) or {}, allowed, f'the sweep of {name}')
+        options = {**defaults, **_options(config, allowed, name)}
+        for dest, values in sweep.items():
+            if not isinstance(values, list) or not values:
+                raise ValueError(f"Sweep values for {dest} in {name} must be a non-empty list")
+        keys = list(sweep)
+        for values in itertools.product(*(sweep[key] for key in keys)):
+            suffix = ''.join(f'_{key}-{_sweep_value(value)}' for key, value in zip(keys, values))
+            configs.append((name + suffix, {**options, **dict(zip(keys, values))}))
+    names = [name for name, _ in configs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Config names must be unique: {', '.join(duplicates)}")
+    return configs
+
+def input_name(path):
+    """File name of an input without its directory and extensions, used to name its outputs"""
+    name = os.path.basename(path)
+    return name.split('.')[0] or name
@@ -0,0 +1,429 @@
+import gzip
+import os
+import shutil
+
+# Format name -> file extensions (the first is used for new files) and download mimetype.
+# The readers below import pandas themselves, so the command line tool can build its
+# parser from this table without loading it.
+OUTPUT_FORMATS = {
+    'csv': (('.csv',), 'text/csv'),
+    'csv.gz': (('.csv.gz',), 'application/gzip'),
+    'csv.zst': (('.csv.zst',), 'application/zstd'),
+    'parquet': (('.parquet',), 'application/vnd.apache.parquet'),
+    'feather': (('.feather', '.arrow'), 'application/vnd.apache.arrow.file'),
+}
+DEFAULT_FORMAT = 'csv'
+
+def _pyarrow(fmt):
+    """pyarrow is only needed for the columnar formats, so it is imported on demand"""
+    try:
+        import pyarrow
+        import pyarrow.csv
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError(f"The {fmt} format requires pyarrow. Install it with: pip install pyarrow")
+    return pyarrow
+
+def arrow_available():
+    """Whether pyarrow can be imported, for readers that fall back to pandas without it"""
+    try:
+        _pyarrow('arrow')
+        return True
+    except ValueError:
+        return False
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("The csv.zst format requires zstandard. Install it with: pip install zstandard")
+    return zstandard
+
+def format_from_path(path, default=DEFAULT_FORMAT):
+    """Output format implied by a file name's extension, or `default` when it has none we know"""
+    name = str(path).lower()
+    matches = [(len(ext), fmt) for fmt, (extensions, _) in OUTPUT_FORMATS.items()
+               for ext in extensions if name.endswith(ext)]
+    return max(matches)[1] if matches else default
+
+def extension(fmt):
+    return OUTPUT_FORMATS[fmt][0][0]
+
+def mimetype(fmt):
+    return OUTPUT_FORMATS[fmt][1]
+
+def require_format(fmt):
+    """Raise ValueError unless fmt is a known format whose optional dependency is installed"""
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {fmt}. Use one of: {', '.join(OUTPUT_FORMATS)}")
+    if fmt in ('parquet', 'feather'):
+        _pyarrow(fmt)
+    elif fmt == 'csv.zst':
+        _zstandard()
+
+def part_path(path, index):
+    """Path of the index-th part file appended to a Parquet or Feather file (0 is the file itself)"""
+    if index == 0:
+        return path
+    fmt = format_from_path(path)
+    ext = max((ext for ext in OUTPUT_FORMATS[fmt][0] if path.lower().endswith(ext)), key=len)
+    return f'{path[:-len(ext)]}.part-{index:05d}{path[-len(ext):]}'
+
+def file_parts(path):
+    """The file and the part files appended to it, in row order"""
+    parts = [path]
+    if format_from_path(path) in ('parquet', 'feather'):
+        while os.path.exists(part_path(path, len(parts))):
+            parts.append(part_path(path, len(parts)))
+    return parts
+
+class FrameWriter:
+    """
+    Writes DataFrames to one file in any of the output formats, chunk by chunk.
+
+    CSV variants stream through a single (compressed) text handle, Parquet
+    adds a row group per chunk and Feather a record batch per chunk. The
+    columnar formats take their schema from the first chunk; later chunks
+    are converted to it.
+
+    With append=True the chunks are added after the rows already in the
+    file. CSV variants are opened for appending (gzip and zstd files may
+    hold several compressed frames back to back). Parquet and Feather files
+    cannot grow in place, so each append goes to a new part file next to
+    them (see file_parts), with the schema of the existing file; the readers
+    in this module read the parts as one file, and merge_parts() folds them
+    back in. abort() undoes an unfinished append.
+    """
+
+    def __init__(self, path, fmt=None, append=False):
+        self.path = path
+        self.fmt = fmt or format_from_path(path)
+        require_format(self.fmt)
+        self.pa = _pyarrow(self.fmt) if self.fmt in ('parquet', 'feather') else None
+        self.append = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.original_size = os.path.getsize(path) if self.append else None
+        self.part = None
+        self.handle = None
+        self.writer = None
+        self.schema = None
+
+    def write(self, chunk):
+        if self.pa is None:
+            self._write_csv(chunk)
+            return
+        if self.append and self.writer is None:
+            self._open_part()
+        try:
+            table = self.pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError) as e:
+            raise ValueError(f"Column types changed between chunks, which {self.fmt} cannot store: {str(e)}")
+        if self.writer is None:
+            self._open(table.schema)
+        self.writer.write_table(table)
+
+    def _open(self, schema):
+        self.schema = schema
+        if self.fmt == 'parquet':
+            self.writer = self.pa.parquet.ParquetWriter(self.path, self.schema)
+        else:
+            # Left uncompressed so readers can memory-map the file
+            self.writer = self.pa.ipc.new_file(self.path, self.schema)
+
+    def _open_part(self):
+        schema = read_schema(self.path)
+        self.part = part_path(self.path, len(file_parts(self.path)))
+        self.path, self.target = self.part, self.path
+        self._open(schema)
+
+    def _write_csv(self, chunk):
+        header = self.handle is None and not self.append
+        if self.handle is None:
+            mode = 'at' if self.append else 'wt'
+            if self.fmt == 'csv.gz':
+                self.handle = gzip.open(self.path, mode, newline='')
+            elif self.fmt == 'csv.zst':
+                self.handle = _zstandard().open(self.path, mode, newline='')
+            else:
+                self.handle = open(self.path, mode[0], newline='')
+        chunk.to_csv(self.handle, header=header, index=False)
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+        if self.writer is not None:
+            self.writer.close()
+        if self.part is not None:
+            self.path = self.target
+
+    def abort(self):
+        """Close the file, dropping an append's new rows (a new file is left as it is)"""
+        if self.handle is not None:
+            self.handle.close()
+        if self.writer is not None:
+            self.writer.close()
+        if self.part is not None:
+            os.remove(self.part)
+            self.path, self.part = self.target, None
+        elif self.original_size is not None:
+            os.truncate(self.path, self.original_size)
+        self.handle = self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_frame(df, path, fmt=None):
+    """Write a whole DataFrame in the format given, or the one implied by path"""
+    with FrameWriter(path, fmt) as writer:
+        writer.write(df)
+
+def write_table(table, path, fmt=None, chunksize=100_000):
+    """
+    Write an Arrow table in the format given, or the one implied by path.
+
+    The columnar formats take the table as it is. CSV variants go through
+    pandas `chunksize` rows at a time, so the text matches write_frame.
+    """
+    fmt = fmt or format_from_path(path)
+    require_format(fmt)
+    if fmt == 'parquet':
+        _pyarrow(fmt).parquet.write_table(table, path)
+    elif fmt == 'feather':
+        pa = _pyarrow(fmt)
+        with pa.ipc.new_file(path, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        with FrameWriter(path, fmt) as writer:
+            for batch in table.to_batches(chunksize):
+                writer.write(batch.to_pandas())
+            if not table.num_rows:
+                writer.write(table.to_pandas())
+
+def _arrow_table(path, fmt):
+    """Memory-mapped Arrow table of a Feather file; no data is copied until it is used"""
+    pa = _pyarrow(fmt)
+    return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+def _read_csv_table(source, columns):
+    """
+    Arrow's multithreaded CSV reader, with the column types read_csv would give.
+
+    Arrow turns ISO dates and times into temporal types and empty columns
+    into nulls; pandas keeps the text and uses float NaN, so those columns
+    are read again as strings and cast to float respectively.
+    """
+    pa = _pyarrow('csv')
+    options = {'strings_can_be_null': True}
+    if columns is not None:
+        options['include_columns'] = columns
+    table = pa.csv.read_csv(source, convert_options=pa.csv.ConvertOptions(**options))
+    temporal = [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+    if temporal:
+        _rewind(source)
+        text = pa.csv.read_csv(source, convert_options=pa.csv.ConvertOptions(
+            include_columns=temporal, column_types={name: pa.string() for name in temporal},
+            strings_can_be_null=True))
+        for name in temporal:
+            table = table.set_column(table.schema.get_field_index(name), name, text[name])
+    for index, field in enumerate(table.schema):
+        if pa.types.is_null(field.type):
+            table = table.set_column(index, field.name, table[field.name].cast(pa.float64()))
+    return table
+
+def read_table(source, fmt=None, columns=None):
+    """
+    Arrow table of an input file, limited to `columns` when given.
+
+    Parquet and Feather are memory-mapped, so columns that are never
+    converted are never read from disk. CSV variants use Arrow's CSV reader.
+    `source` is a path or, for CSV, a binary file object.
+    """
+    fmt = fmt or format_from_path(source if isinstance(source, str) else '')
+    pa = _pyarrow(fmt)
+    if fmt in ('parquet', 'feather'):
+        # Part files appended to the file are read with it
+        tables = [_read_columnar(part, fmt, columns) for part in file_parts(source)]
+        return tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+    if fmt == 'csv.zst' and isinstance(source, str):
+        # Arrow only picks the codec from the extension for .gz and .bz2
+        source = pa.input_stream(source, compression='zstd')
+    return _read_csv_table(source, columns)
+
+def _read_columnar(path, fmt, columns):
+    if fmt == 'parquet':
+        return _pyarrow(fmt).parquet.read_table(path, columns=columns, memory_map=True)
+    table = _arrow_table(path, fmt)
+    return table.select(columns) if columns is not None else table
+
+def read_frame(source, fmt=None, columns=None):
+    """
+    DataFrame of an input file, limited to `columns` when given.
+
+    Goes through read_table when pyarrow is installed. CSV files fall back
+    to pandas' reader without it, and also when Arrow cannot parse them
+    (e.g. a column whose type changes after the first block), so callers
+    see read_csv's errors.
+    """
+    import pandas as pd
+    fmt = fmt or format_from_path(source if isinstance(source, str) else '')
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown input format {fmt}. Use one of: {', '.join(OUTPUT_FORMATS)}")
+    if fmt in ('parquet', 'feather'):
+        return read_table(source, fmt, columns).to_pandas()
+    if not arrow_available():
+        return pd.read_csv(source, usecols=columns)
+    try:
+        return read_table(source, fmt, columns).to_pandas()
+    except Exception as e:
+        print(f"Arrow could not read the CSV, using pandas: {str(e)}")
+        _rewind(source)
+    return pd.read_csv(source, usecols=columns)
+
+def split_table(table, columns):
+    """(DataFrame of `columns`, Arrow table of the remaining columns) of a table"""
+    import pandas as pd
+    rest = [name for name in table.column_names if name not in columns]
+    frame = table.select(list(columns)).to_pandas()
+    if not len(frame.columns):
+        # A frame without columns has no rows either; keep the row count for merge_columns
+        frame = pd.DataFrame(index=pd.RangeIndex(table.num_rows))
+    return frame, table.select(rest)
+
+def merge_columns(frame, rest, columns):
+    """
+    Arrow table of `columns` from a split_table frame and its remaining columns.
+
+    The frame may have lost rows (selection bias); its index still holds
+    the row positions in the input, so the remaining columns are taken at
+    those positions without ever being converted to pandas.
+    """
+    import pandas as pd
+    pa = _pyarrow('arrow')
+    if not frame.index.equals(pd.RangeIndex(rest.num_rows)):
+        rest = rest.take(frame.index.to_numpy())
+    return pa.table([pa.Array.from_pandas(frame[name]) if name in frame.columns else rest[name]
+                     for name in columns], names=list(columns))
+
+def read_schema(path):
+    """Arrow schema of a Parquet or Feather file, read from its metadata"""
+    fmt = format_from_path(path)
+    pa = _pyarrow(fmt)
+    if fmt == 'parquet':
+        return pa.parquet.read_schema(path)
+    return pa.ipc.open_file(pa.memory_map(path)).schema
+
+def _num_rows(path, fmt):
+    pa = _pyarrow(fmt)
+    if fmt == 'parquet':
+        return pa.parquet.ParquetFile(path).metadata.num_rows
+    return _arrow_table(path, fmt).num_rows
+
+def read_columns(path):
+    """Column names of a file written in any output format"""
+    import pandas as pd
+    if format_from_path(path) in ('parquet', 'feather'):
+        return list(read_schema(path).names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def merge_parts(path):
+    """
+    Fold the part files appended to a Parquet or Feather file back into it.
+
+    Record batches are copied as they are, into a new file that replaces the
+    old one. Returns whether there was anything to merge.
+    """
+    parts = file_parts(path)
+    if len(parts) == 1:
+        return False
+    fmt = format_from_path(path)
+    pa = _pyarrow(fmt)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    schema = read_schema(path)
+    if fmt == 'parquet':
+        with pa.parquet.ParquetWriter(tmp_path, schema) as writer:
+            for part in parts:
+                for batch in pa.parquet.ParquetFile(part).iter_batches():
+                    writer.write_batch(batch)
+    else:
+        with pa.ipc.new_file(tmp_path, schema) as writer:
+            for part in parts:
+                writer.write_table(_arrow_table(part, fmt))
+    os.replace(tmp_path, path)
+    for part in parts[1:]:
+        os.remove(part)
+    return True
+
+def iter_frame_chunks(path, chunksize, columns=None):
+    """DataFrames of at most `chunksize` rows read back from a file, restricted to `columns`"""
+    import pandas as pd
+    fmt = format_from_path(path)
+    if fmt == 'parquet':
+        for part in file_parts(path):
+            batches = _pyarrow(fmt).parquet.ParquetFile(part).iter_batches(batch_size=chunksize, columns=columns)
+            for batch in batches:
+                yield batch.to_pandas()
+    elif fmt == 'feather':
+        for part in file_parts(path):
+            table = _arrow_table(part, fmt)
+            if columns:
+                table = table.select(columns)
+            for start in range(0, table.num_rows, chunksize):
+                yield table.slice(start, chunksize).to_pandas()
+    else:
+        with pd.read_csv(path, chunksize=chunksize, usecols=columns) as reader:
+            yield from reader
+
+def read_rows(path, offset, limit, columns=None):
+    """
+    Rows [offset, offset + limit) of a file as a DataFrame.
+
+    Parquet only decodes the row groups overlapping the range and Feather
+    slices the memory-mapped table, so neither reads the whole file. Part
+    files appended to either are skipped by their row counts.
+    """
+    import pandas as pd
+    fmt = format_from_path(path)
+    if fmt not in ('parquet', 'feather'):
+        return pd.read_csv(path, skiprows=range(1, offset + 1), nrows=limit, usecols=columns)
+    parts = file_parts(path)
+    if len(parts) == 1:
+        return _read_columnar_rows(path, fmt, offset, limit, columns)
+    pages = []
+    start = 0
+    for part in parts:
+        rows = _num_rows(part, fmt)
+        first = min(max(offset - start, 0), rows)
+        count = max(min(offset + limit - start, rows) - first, 0)
+        if count or (part == parts[-1] and not pages):
+            pages.append(_read_columnar_rows(part, fmt, first, count, columns))
+        start += rows
+    return pd.concat(pages, ignore_index=True) if len(pages) > 1 else pages[0]
+
+def _read_columnar_rows(path, fmt, offset, limit, columns):
+    if fmt == 'parquet':
+        pa = _pyarrow(fmt)
+        parquet_file = pa.parquet.ParquetFile(path)
+        groups = []
+        start = 0
+        for index in range(parquet_file.num_row_groups):
+            size = parquet_file.metadata.row_group(index).num_rows
+            if start + size > offset and start < offset + limit:
+                groups.append(index)
+            start += size
+        if not groups:
+            table = parquet_file.schema_arrow.empty_table()
+            return (table.select(columns) if columns else table).to_pandas()
+        first = sum(parquet_file.metadata.row_group(index).num_rows for index in range(groups[0]))
+        table = parquet_file.read_row_groups(groups, columns=columns)
+        return table.slice(offset - first, limit).to_pandas()
+    table = _arrow_table(path, fmt)
+    if columns:
+        table = table.select(columns)
+    return table.slice(offset, limit).to_pandas()
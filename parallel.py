@@ -0,0 +1,187 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Below this many rows the work stays in the calling process. A sharded call on a warm
+# pool pays 1-2 ms to dispatch its tasks, about a tenth of the serial time at 200k
+# rows, plus a copy of the columns into shared memory that grows with the rows.
+# Measure the crossover on the target host with benchmarks/bench_injection.py
+# --workers and set BIAS_PARALLEL_MIN_ROWS
+PARALLEL_MIN_ROWS = int(os.environ.get('BIAS_PARALLEL_MIN_ROWS', 200_000))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def use_workers(workers, rows):
+    return bool(workers) and workers > 1 and rows >= PARALLEL_MIN_ROWS
+
+def worker_pool(workers):
+    """Process pool with `workers` processes, started on first use and reused afterwards"""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # 'spawn' is safe from threaded servers and behaves the same on every platform
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pools[workers] = pool
+        return pool
+
+def start_pool(workers):
+    """Start the pool's processes now rather than on the first sharded call (about 0.5 s per process)"""
+    pool = worker_pool(workers)
+    list(pool.map(abs, range(workers)))
+    return pool
+
+@atexit.register
+def shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=True)
+        _pools.clear()
+
+def row_shards(rows, workers):
+    """(start, stop) ranges splitting `rows` rows into `workers` nearly equal contiguous shards"""
+    bounds = np.linspace(0, rows, min(workers, max(rows, 1)) + 1).astype(np.int64)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+class SharedArrays:
+    """
+    NumPy arrays copied into shared memory for the length of a with block.
+
+    Each array is copied once, into a C-ordered buffer of the same shape; a
+    list of equal-length 1-D arrays becomes one (len(list), length) array
+    without being stacked first.
+    Workers map the same buffers with attach_arrays(specs), so the columns
+    are never pickled; writes made by workers are visible through
+    shared[name] in the parent.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.blocks = []
+        self.views = {}
+        self.specs = {}
+
+    def __enter__(self):
+        for name, array in self.arrays.items():
+            if isinstance(array, list):
+                shape = (len(array), len(array[0]) if array else 0)
+                dtype = np.result_type(*array) if array else np.dtype(float)
+            else:
+                array = np.asarray(array)
+                shape, dtype = array.shape, array.dtype
+            block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+            self.blocks.append(block)
+            view = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            if isinstance(array, list):
+                for row, values in zip(view, array):
+                    row[...] = values
+            else:
+                view[...] = array
+            self.views[name] = view
+            self.specs[name] = (block.name, shape, dtype.str)
+        return self
+
+    def __getitem__(self, name):
+        return self.views[name]
+
+    def __exit__(self, *exc_info):
+        # Views have to go before their buffers can be released
+        self.views.clear()
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+def attach_arrays(specs):
+    """Worker-side views of SharedArrays, plus the blocks to close once done with them"""
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return arrays, blocks
+
+def _shard_task(task, specs, start, stop, *args):
+    """Run task(arrays, start, stop, *args) in a worker against the shared arrays"""
+    arrays, blocks = attach_arrays(specs)
+    try:
+        return task(arrays, start, stop, *args)
+    finally:
+        # The task's views are gone once it returns, so the buffers can be released
+        arrays.clear()
+        for block in blocks:
+            block.close()
+
+def _run_shards(task, specs, rows, workers, *args):
+    pool = worker_pool(workers)
+    futures = [pool.submit(_shard_task, task, specs, start, stop, *args)
+               for start, stop in row_shards(rows, workers)]
+    return [future.result() for future in futures]
+
+def _group_effects_task(arrays, start, stop):
+    codes = arrays['codes'][start:stop]
+    values = arrays['values'][start:stop]
+    hit = codes >= 0
+    selected = values[hit]
+    group_codes = codes[hit]
+    values[hit] = np.maximum(selected * arrays['scale'][group_codes],
+                             selected - arrays['offset'][group_codes])
+
+def apply_group_effects(values, codes, scale, offset, workers):
+    """
+    Row-sharded version of the batched update in bias_engine.inject_group_effects.
+
+    `values` is a (rows, targets) float array updated in place: a row whose
+    group code g is >= 0 becomes max(x * scale[g], x - offset[g]).
+    """
+    with SharedArrays({'values': values, 'codes': codes, 'scale': scale, 'offset': offset}) as shared:
+        _run_shards(_group_effects_task, shared.specs, len(values), workers)
+        values[...] = shared['values']
+    return values
+
+def _group_aggregates_task(arrays, start, stop, groups):
+    codes = arrays['codes'][start:stop]
+    columns = arrays['columns'][:, start:stop]
+    shape = (groups, len(columns))
+    count, total, sumsq = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    for j, column in enumerate(columns):
+        valid = (codes >= 0) & ~np.isnan(column)
+        group_codes = codes[valid]
+        column = column[valid]
+        count[:, j] = np.bincount(group_codes, minlength=groups)
+        total[:, j] = np.bincount(group_codes, weights=column, minlength=groups)
+        sumsq[:, j] = np.bincount(group_codes, weights=column * column, minlength=groups)
+    return count, total, sumsq
+
+def group_aggregate_arrays(columns, codes, groups, workers):
+    """
+    Per-group count, sum and sum of squares of every row of `columns`.
+
+    `columns` is a (columns, rows) float array or a list of columns. Each shard aggregates its
+    rows and the partial results are added up, giving (count, sum, sumsq),
+    each shaped (groups, columns). Rows with a negative code and NaN values
+    are left out.
+    """
+    with SharedArrays({'columns': columns, 'codes': codes}) as shared:
+        parts = _run_shards(_group_aggregates_task, shared.specs, len(codes), workers, groups)
+    return tuple(sum(part[i] for part in parts) for i in range(3))
+
+def _bin_counts_task(arrays, start, stop, edges):
+    counts = []
+    for column, column_edges in zip(arrays['columns'][:, start:stop], edges):
+        column = column[~np.isnan(column)]
+        counts.append(np.bincount(np.searchsorted(column_edges, column, side='right'),
+                                  minlength=len(column_edges) + 1))
+    return counts
+
+def bin_count_arrays(columns, edges, workers):
+    """Bucket counts of each of `columns` (a list or 2-D array), as binning.count_bins, summed over shards"""
+    with SharedArrays({'columns': columns}) as shared:
+        parts = _run_shards(_bin_counts_task, shared.specs, shared['columns'].shape[1], workers, edges)
+    return [sum(part[j] for part in parts) for j in range(len(edges))]
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_MAX_ENTRIES = 64
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+def content_key(stream, params, block_size=1024 * 1024):
+    """
+    SHA-256 of a file's content plus the parameters that shape its result.
+
+    The stream is hashed block by block and rewound afterwards, so identical
+    uploads map to the same key whatever their filename.
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(block_size), b''):
+        digest.update(block)
+    stream.seek(0)
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Least-recently-used store of serialized /upload responses.
+
+    Bounded both by number of entries and by total response size. Each entry
+    remembers the biased file its download link points at; an entry whose
+    file has gone is treated as a miss.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Stored response body for key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] and not os.path.exists(entry[1]):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, body, path=None):
+        """Store a response body and the artifact it links to, evicting old entries as needed"""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (body, path)
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        body, _ = self.entries.pop(key)
+        self.size -= len(body)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
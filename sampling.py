@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+def sample_rows(df, size, seed=0):
+    """Uniform sample of `size` rows without replacement, in their original order"""
+    if len(df) <= size:
+        return df
+    positions = np.random.default_rng(seed).choice(len(df), size, replace=False)
+    positions.sort()
+    return df.take(positions)
+
+def stratified_sample(df, size, by=None, seed=0):
+    """
+    About `size` rows in their original order, each group of `by` keeping its share.
+
+    Every group keeps at least one row, so small groups stay visible in a
+    downsampled plot. Without `by` this is sample_rows.
+    """
+    if len(df) <= size:
+        return df
+    if by is None:
+        return sample_rows(df, size, seed)
+    # Missing values form their own group, code 0 after the shift
+    codes = pd.factorize(df[by])[0] + 1
+    counts = np.bincount(codes)
+    quotas = np.maximum(np.round(counts * size / len(df)), np.minimum(counts, 1)).astype(np.int64)
+    # Random order within each group; every group keeps its first `quota` rows
+    order = np.lexsort((np.random.default_rng(seed).random(len(df)), codes))
+    starts = np.cumsum(counts) - counts
+    rank = np.arange(len(df)) - np.repeat(starts, counts)
+    positions = np.sort(order[rank < np.repeat(quotas, counts)])
+    return df.take(positions)
@@ -0,0 +1,631 @@
+import json
+import os
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+from bias_engine import (find_sensitive_columns, find_metric_columns, find_minority_values,
+                         apply_minority_bias, is_score_column, minority_rule, SENSITIVE_KEYWORDS)
+from bias_metrics import (group_aggregates, merge_aggregates,
+                          statistics_from_aggregates, summarize_groups)
+from binning import (DensityGrid, QuantileSketch, column_bins, count_bins, density_columns,
+                     density_ranges, label_counts)
+from instrumentation import StageProfile
+from output_formats import FrameWriter, format_from_path, iter_frame_chunks
+from type_inference import CATEGORICAL_RATIO, DistinctSketch, merge_dtypes, read_dtypes
+
+DEFAULT_CHUNKSIZE = 100_000
+# Uploads larger than this are processed chunk by chunk automatically
+CHUNKED_UPLOAD_THRESHOLD = 50 * 1024 * 1024
+# Distinct values of a column are counted exactly up to this many, then estimated with
+# a HyperLogLog sketch, which keeps memory bounded on huge files
+DISTINCT_CAP = 100_000
+
+def iter_clean_chunks(source, chunksize=DEFAULT_CHUNKSIZE, dtypes=None, last_row=None, **read_kwargs):
+    """
+    Yield cleaned chunks of a CSV file.
+
+    Mirrors the cleaning done on whole uploads: all-NaN rows are dropped and
+    the forward fill is carried across chunk boundaries, so the chunks are
+    identical to slices of the fully cleaned frame. `dtypes`, keyed by the
+    stripped column names, is passed to read_csv so it skips type inference.
+    `last_row`, the last cleaned row of earlier data, continues the fill
+    into rows appended to it.
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    if dtypes:
+        # read_csv wants the column names as they appear in the file
+        header = pd.read_csv(source, nrows=0).columns
+        read_kwargs['dtype'] = {raw: dtypes[raw.strip()] for raw in header if raw.strip() in dtypes}
+        if hasattr(source, 'seek'):
+            source.seek(0)
+    with pd.read_csv(source, chunksize=chunksize, **read_kwargs) as reader:
+        for chunk in reader:
+            chunk.columns = chunk.columns.str.strip()
+            chunk = chunk.dropna(how='all')
+            if chunk.empty:
+                continue
+            chunk = chunk.ffill()
+            if last_row is not None:
+                # Only leading NaNs are left after the fill, take them from the previous chunk
+                chunk = chunk.fillna(last_row)
+            last_row = chunk.iloc[-1]
+            yield chunk
+
+def _distinct_key(values):
+    # Numbers hash as floats, so int and float chunks of a column count the same values once
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    return values
+
+def _add_series(total, part):
+    return part.copy() if total is None else total.add(part, fill_value=0)
+
+def _json_default(value):
+    # NumPy scalars (group labels, minority values, row values) as plain numbers
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def _series_state(series):
+    if series is None:
+        return None
+    return {'index': series.index.tolist(), 'name': series.index.name,
+            'dtype': str(series.dtype), 'values': series.tolist()}
+
+def _load_series(state):
+    if state is None:
+        return None
+    return pd.Series(state['values'], index=pd.Index(state['index'], name=state['name']), dtype=state['dtype'])
+
+def _frame_state(frame):
+    """A frame as lists of plain values, with its dtypes and (possibly tuple) column labels"""
+    if frame is None:
+        return None
+    return {'index': frame.index.tolist(), 'name': frame.index.name,
+            'columns': [list(col) if isinstance(col, tuple) else col for col in frame.columns],
+            'dtypes': [str(dtype) for dtype in frame.dtypes],
+            'values': [frame.iloc[:, j].tolist() for j in range(frame.shape[1])]}
+
+def _load_frame(state):
+    if state is None:
+        return None
+    index = pd.Index(state['index'], name=state['name'])
+    columns = state['columns']
+    if columns and isinstance(columns[0], list):
+        columns = pd.MultiIndex.from_tuples([tuple(col) for col in columns])
+    data = {j: pd.Series(values, index=index, dtype=dtype)
+            for j, (values, dtype) in enumerate(zip(state['values'], state['dtypes']))}
+    return pd.DataFrame(data, index=index).set_axis(columns, axis=1)
+
+class ColumnTypeAccumulator:
+    """Incremental equivalent of detect_column_types over a stream of chunks"""
+
+    def __init__(self, distinct_cap=DISTINCT_CAP, sketch=False):
+        self.distinct_cap = distinct_cap
+        self.rows = 0
+        # Exact set of each column's values, replaced by a DistinctSketch past distinct_cap
+        self.distinct = {}
+        self.convertible = {}
+        self.minimum = {}
+        self.maximum = {}
+        # Quantile sketches of numeric columns, kept only for quantile binning
+        self.sketches = {} if sketch else None
+        # First two distinct values of sensitive-looking columns, in order of appearance
+        self.leading_values = {}
+        # Column dtypes over all chunks, for read_csv on later passes
+        self.dtypes = {}
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        merge_dtypes(self.dtypes, chunk)
+        for column in chunk.columns:
+            values = chunk[column]
+            seen = self.distinct.setdefault(column, set())
+            if isinstance(seen, DistinctSketch):
+                seen.update(_distinct_key(values))
+            else:
+                seen.update(values.dropna().unique().tolist())
+                if len(seen) > self.distinct_cap:
+                    sketch = self.distinct[column] = DistinctSketch()
+                    sketch.update(_distinct_key(pd.Series(list(seen))))
+
+            if self.convertible.get(column, True):
+                if pd.api.types.is_numeric_dtype(values):
+                    numeric = values
+                else:
+                    try:
+                        numeric = pd.to_numeric(values, errors='raise')
+                    except Exception:
+                        numeric = None
+                        self.convertible[column] = False
+                if numeric is not None:
+                    self.convertible[column] = True
+                    self.observe_numeric(column, numeric)
+
+            if any(sensitive in column.lower() for sensitive in SENSITIVE_KEYWORDS):
+                leading = self.leading_values.get(column, [])
+                if len(leading) < 2:
+                    candidates = pd.Series(leading + list(values.unique()[:2]), dtype=object)
+                    self.leading_values[column] = list(pd.unique(candidates))[:2]
+
+    def observe_numeric(self, column, numeric):
+        """Track the range (and sketch) of a column's numeric values"""
+        if numeric.notna().any():
+            low, high = numeric.min(), numeric.max()
+            self.minimum[column] = min(self.minimum.get(column, low), low)
+            self.maximum[column] = max(self.maximum.get(column, high), high)
+        if self.sketches is not None:
+            self.sketches.setdefault(column, QuantileSketch()).update(numeric)
+
+    def bins(self, column, bins=None, binning='width'):
+        """Bucket edges and labels of a numeric column from the values seen so far"""
+        return column_bins(column, bins=bins, method=binning,
+                           bounds=(self.minimum.get(column, np.nan), self.maximum.get(column, np.nan)),
+                           sketch=self.sketches.get(column) if self.sketches is not None else None)
+
+    def column_types(self):
+        column_types = {}
+        for column, seen in self.distinct.items():
+            distinct = seen.estimate() if isinstance(seen, DistinctSketch) else len(seen)
+            if self.rows and distinct < CATEGORICAL_RATIO * self.rows:
+                column_types[column] = 'categorical'
+            elif self.convertible.get(column, False):
+                column_types[column] = 'numeric'
+            else:
+                column_types[column] = 'text'
+        return column_types
+
+    def minority_values(self, sensitive_columns):
+        return {col: self.leading_values[col][1] for col in sensitive_columns
+                if len(self.leading_values.get(col, [])) >= 2}
+
+class ChunkSummary:
+    """Bias metrics and visualization counts for one dataset, built chunk by chunk"""
+
+    def __init__(self, column_types, column_bins=None, bins=None, binning='width', density=None):
+        self.column_types = column_types
+        self.sensitive_columns = find_sensitive_columns(column_types)
+        self.metric_columns = find_metric_columns(column_types)
+        self.numeric_columns = [col for col, type_ in column_types.items() if type_ == 'numeric']
+        self.categorical_columns = [col for col, type_ in column_types.items() if type_ == 'categorical']
+        # Bucket edges and labels known before the pass, the rest come from the values seen
+        self.column_bins = dict(column_bins or {})
+        self.binner = ColumnTypeAccumulator(sketch=binning == 'quantile')
+        self.bins = bins
+        self.binning = binning
+        self.group_aggregates = {}
+        self.distributions = {}
+        self.ranges = {}
+        # Empty DensityGrid with its ranges fixed, or None
+        self.density = density
+
+    def update(self, chunk):
+        if self.sensitive_columns and self.metric_columns:
+            metrics = chunk[self.metric_columns].apply(pd.to_numeric, errors='coerce')
+            for sensitive_col in self.sensitive_columns:
+                self.group_aggregates[sensitive_col] = merge_aggregates(
+                    self.group_aggregates.get(sensitive_col),
+                    group_aggregates(metrics, chunk[sensitive_col]))
+
+        for col in self.categorical_columns:
+            self.distributions[col] = _add_series(self.distributions.get(col), chunk[col].value_counts())
+
+        for col in self.numeric_columns:
+            values = pd.to_numeric(chunk[col], errors='coerce')
+            if col in self.column_bins:
+                self._count(col, values)
+            else:
+                self.binner.observe_numeric(col, values)
+
+        if self.density is not None:
+            self.density.update(chunk[self.density.x], chunk[self.density.y])
+
+    def _count(self, col, values):
+        counts = count_bins(values, self.column_bins[col][0])
+        self.ranges[col] = counts if col not in self.ranges else self.ranges[col] + counts
+
+    def pending_range_columns(self):
+        """Numeric columns whose bucket edges are only known after the pass"""
+        return [col for col in self.numeric_columns if col not in self.column_bins]
+
+    def finish_bins(self):
+        for col in self.pending_range_columns():
+            self.column_bins[col] = self.binner.bins(col, self.bins, self.binning)
+
+    def count_ranges(self, chunk):
+        """Count a chunk for the columns returned by pending_range_columns"""
+        for col in chunk.columns:
+            self._count(col, pd.to_numeric(chunk[col], errors='coerce'))
+
+    def bias_metrics(self):
+        bias_metrics = {}
+        bias_present = {}
+        group_metrics = {}
+        for sensitive_col, aggregates in self.group_aggregates.items():
+            if len(aggregates) < 2:
+                continue
+            stats = statistics_from_aggregates(aggregates)
+            summary = summarize_groups(stats, self.metric_columns)
+            for result, part in zip((bias_metrics, bias_present, group_metrics), summary):
+                result[sensitive_col] = part
+        return bias_metrics, bias_present, group_metrics
+
+    def visualization_data(self):
+        viz_data = {}
+        for col in self.categorical_columns:
+            counts = self.distributions.get(col)
+            if counts is not None:
+                viz_data[f'{col}_distribution'] = counts.astype(int).to_dict()
+        for col in self.numeric_columns:
+            if col in self.column_bins:
+                labels = self.column_bins[col][1]
+                viz_data[f'{col}_ranges'] = label_counts(labels, self.ranges.get(col, [0] * len(labels)))
+        if self.density is not None:
+            viz_data['density'] = self.density.to_dict()
+        return viz_data
+
+    def state(self):
+        """The finished counts and sums as plain JSON values, read back by from_state"""
+        return {
+            'column_types': self.column_types,
+            'column_bins': {col: [np.asarray(edges, dtype=float).tolist(), labels]
+                            for col, (edges, labels) in self.column_bins.items()},
+            'bins': self.bins,
+            'binning': self.binning,
+            'group_aggregates': {col: _frame_state(frame) for col, frame in self.group_aggregates.items()},
+            'distributions': {col: _series_state(counts) for col, counts in self.distributions.items()},
+            'ranges': {col: np.asarray(counts).tolist() for col, counts in self.ranges.items()},
+            'density': self.density.state() if self.density is not None else None
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        column_bins = {col: (np.array(edges, dtype=float), labels)
+                       for col, (edges, labels) in state['column_bins'].items()}
+        density = DensityGrid.from_state(state['density']) if state['density'] is not None else None
+        summary = cls(state['column_types'], column_bins, state['bins'], state['binning'], density)
+        summary.group_aggregates = {col: _load_frame(frame) for col, frame in state['group_aggregates'].items()}
+        summary.distributions = {col: _load_series(counts) for col, counts in state['distributions'].items()}
+        summary.ranges = {col: np.array(counts, dtype=np.int64) for col, counts in state['ranges'].items()}
+        return summary
+
+class DifferenceAccumulator:
+    """Incremental equivalent of calculate_differences"""
+
+    def __init__(self, group_col='gender'):
+        self.group_col = group_col
+        self.non_numeric = set()
+        self.sums = {'original': None, 'biased': None}
+        self.counts = {'original': None, 'biased': None}
+        self.group_sums = {'original': None, 'biased': None}
+        self.group_counts = {'original': None, 'biased': None}
+
+    def update(self, original_chunk, biased_chunk):
+        numeric = biased_chunk.select_dtypes(include='number').columns
+        self.non_numeric.update(col for col in biased_chunk.columns if col not in numeric)
+        for name, chunk in (('original', original_chunk), ('biased', biased_chunk)):
+            values = chunk[numeric].apply(pd.to_numeric, errors='coerce')
+            self.sums[name] = _add_series(self.sums[name], values.sum())
+            self.counts[name] = _add_series(self.counts[name], values.count())
+            if self.group_col in chunk.columns:
+                grouped = values.groupby(chunk[self.group_col], observed=True)
+                self.group_sums[name] = _add_series(self.group_sums[name], grouped.sum())
+                self.group_counts[name] = _add_series(self.group_counts[name], grouped.count())
+
+    def differences(self):
+        differences = {}
+        if self.sums['biased'] is None:
+            return differences
+        for col in self.sums['biased'].index:
+            if col in self.non_numeric:
+                continue
+            original_mean = float(self.sums['original'][col] / self.counts['original'][col])
+            biased_mean = float(self.sums['biased'][col] / self.counts['biased'][col])
+            mean_differences = {}
+            if self.group_sums['biased'] is not None:
+                biased_means = self.group_sums['biased'][col] / self.group_counts['biased'][col]
+                original_means = self.group_sums['original'][col] / self.group_counts['original'][col]
+                mean_differences = (biased_means - original_means).to_dict()
+            differences[col] = {
+                'mean_differences': mean_differences,
+                'original_mean': original_mean,
+                'biased_mean': biased_mean,
+                'total_change': biased_mean - original_mean
+            }
+        return differences
+
+    def state(self):
+        return {
+            'group_col': self.group_col,
+            'non_numeric': sorted(self.non_numeric),
+            'sums': {name: _series_state(sums) for name, sums in self.sums.items()},
+            'counts': {name: _series_state(counts) for name, counts in self.counts.items()},
+            'group_sums': {name: _frame_state(sums) for name, sums in self.group_sums.items()},
+            'group_counts': {name: _frame_state(counts) for name, counts in self.group_counts.items()}
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        accumulator = cls(state['group_col'])
+        accumulator.non_numeric = set(state['non_numeric'])
+        accumulator.sums = {name: _load_series(sums) for name, sums in state['sums'].items()}
+        accumulator.counts = {name: _load_series(counts) for name, counts in state['counts'].items()}
+        accumulator.group_sums = {name: _load_frame(sums) for name, sums in state['group_sums'].items()}
+        accumulator.group_counts = {name: _load_frame(counts) for name, counts in state['group_counts'].items()}
+        return accumulator
+
+class MetricsState:
+    """
+    Running bias metrics of a stored dataset, updated as rows are appended.
+
+    Keeps what the upload decided once (column types, the minority group of
+    each sensitive column and every bucket edge) with the per-group counts,
+    sums and sums of squares, the category and bucket counts and the totals
+    behind the differences, for the original and the biased rows. append()
+    cleans and biases new rows, adds them to the dataset files and folds them
+    into the metrics, so its cost depends only on the number of new rows.
+    Values outside the stored bucket edges land in the open-ended end buckets.
+    """
+
+    def __init__(self, column_types, minority_values, original, biased, differences,
+                 biased_path, original_path=None, output_format=None):
+        self.column_types = column_types
+        self.minority_values = minority_values
+        self.original = original
+        self.biased = biased
+        self.differences = differences
+        self.biased_path = biased_path
+        self.original_path = original_path
+        self.output_format = output_format or format_from_path(biased_path)
+        self.columns = None
+        self.row_count = 0
+        self.last_row = None
+
+    @classmethod
+    def from_frames(cls, original_df, biased_df, column_types, biased_path, original_path=None,
+                    bins=None, binning='width'):
+        """State of a whole-frame upload, with the bucket edges its response used"""
+        edges = {}
+        for name, frame in (('original', original_df), ('biased', biased_df)):
+            edges[name] = {col: column_bins(col, pd.to_numeric(frame[col], errors='coerce'), bins, binning)
+                           for col, type_ in column_types.items() if type_ == 'numeric'}
+        metric_columns = find_metric_columns(column_types)
+        minority_values = (find_minority_values(original_df, find_sensitive_columns(column_types))
+                           if metric_columns else {})
+        # Density ranges over both frames, as in the upload response
+        columns = density_columns(column_types)
+        ranges = density_ranges([original_df, biased_df], columns) if columns else None
+        density = (lambda: DensityGrid(*columns, *ranges)) if ranges else (lambda: None)
+        state = cls(column_types, minority_values,
+                    ChunkSummary(column_types, edges['original'], bins, binning, density()),
+                    ChunkSummary(column_types, edges['biased'], bins, binning, density()),
+                    DifferenceAccumulator(), biased_path, original_path)
+        state.observe(original_df, biased_df)
+        return state
+
+    def observe(self, original_chunk, biased_chunk):
+        """Fold rows that are already cleaned, biased and written into the metrics"""
+        self.original.update(original_chunk)
+        self.biased.update(biased_chunk)
+        self.differences.update(original_chunk, biased_chunk)
+        if len(original_chunk):
+            self.columns = list(original_chunk.columns)
+            self.row_count += len(original_chunk)
+            self.last_row = original_chunk.iloc[-1]
+
+    def append(self, source, chunksize=DEFAULT_CHUNKSIZE):
+        """
+        Clean, bias, write and measure the rows of a CSV with the dataset's columns.
+
+        Returns the number of rows added. On any error the dataset files are
+        put back as they were, and the state should be loaded again.
+        """
+        metric_columns = find_metric_columns(self.column_types)
+        biased_writer = FrameWriter(self.biased_path, self.output_format, append=True)
+        original_writer = FrameWriter(self.original_path, append=True) if self.original_path else None
+        added = 0
+        try:
+            for chunk in iter_clean_chunks(source, chunksize, last_row=self.last_row):
+                if sorted(chunk.columns) != sorted(self.columns):
+                    raise ValueError(f"Appended rows must have the dataset's columns: {', '.join(self.columns)}")
+                chunk = chunk[self.columns]
+                biased_chunk = apply_minority_bias(chunk.copy(), self.minority_values, metric_columns)
+                biased_writer.write(biased_chunk)
+                if original_writer:
+                    original_writer.write(chunk)
+                self.observe(chunk, biased_chunk)
+                added += len(chunk)
+        except Exception:
+            biased_writer.abort()
+            if original_writer:
+                original_writer.abort()
+            raise
+        biased_writer.close()
+        if original_writer:
+            original_writer.close()
+        return added
+
+    def result(self):
+        """The metrics in the layout of an /upload response"""
+        result = {}
+        for name, summary in (('original', self.original), ('biased', self.biased)):
+            bias_metrics, bias_present, group_metrics = summary.bias_metrics()
+            result[name] = {
+                'bias_metrics': bias_metrics,
+                'bias_present': bias_present,
+                'group_metrics': group_metrics,
+                'visualization_data': summary.visualization_data()
+            }
+        result.update(column_types=self.column_types, differences=self.differences.differences(),
+                      row_count=self.row_count, columns=self.columns)
+        return result
+
+    def save(self, path):
+        """
+        Write the state as JSON: the decided types, minority values and edges
+        with the counts, sums and sums of squares behind the metrics. Nothing
+        in it is executable, and it does not depend on pandas internals.
+        """
+        state = {
+            'column_types': self.column_types,
+            'minority_values': self.minority_values,
+            'original': self.original.state(),
+            'biased': self.biased.state(),
+            'differences': self.differences.state(),
+            'biased_path': self.biased_path,
+            'original_path': self.original_path,
+            'output_format': self.output_format,
+            'columns': self.columns,
+            'row_count': self.row_count,
+            'last_row': _series_state(self.last_row.astype(object)) if self.last_row is not None else None
+        }
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, default=_json_default)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            state = json.load(f)
+        metrics_state = cls(state['column_types'], state['minority_values'],
+                            ChunkSummary.from_state(state['original']), ChunkSummary.from_state(state['biased']),
+                            DifferenceAccumulator.from_state(state['differences']),
+                            state['biased_path'], state['original_path'], state['output_format'])
+        metrics_state.columns = state['columns']
+        metrics_state.row_count = state['row_count']
+        metrics_state.last_row = _load_series(state['last_row'])
+        return metrics_state
+
+def _biased_range(col, low, high, biased):
+    """
+    (min, max) of a column's values before and after the minority bias.
+
+    The rule max(x * scale, x - offset) never decreases as x grows, so the
+    biased values stay between the rule applied to the original extremes.
+    """
+    low, high = float(low), float(high)
+    rule = minority_rule(col) if biased else None
+    if rule is None:
+        return low, high
+    scale, offset = rule
+    return min(low, max(low * scale, low - offset)), max(high, max(high * scale, high - offset))
+
+def run_chunked_pipeline(source, output_path, chunksize=DEFAULT_CHUNKSIZE, bins=None, binning='width',
+                         original_output_path=None, progress=None, output_format=None, state_path=None,
+                         dump=None):
+    """
+    Detect, inject, analyze and write an uploaded CSV without loading it whole.
+
+    The file is read in three bounded passes: type detection, then injection
+    with the biased chunks appended to `output_path` while metrics are
+    aggregated, and finally the range counts of biased columns whose bucket
+    edges are only known once every chunk has been injected. The second pass
+    gives read_csv the dtypes recorded by the first. `bins` and
+    `binning` are passed on to binning.column_bins. When
+    `original_output_path` is given the cleaned original rows are written
+    there alongside the biased ones, so both can be paged through later.
+    `progress` is called with the job stage each pass belongs to; the biased
+    output is written during the inject pass, in `output_format` or the
+    format implied by the extension of `output_path`; a StageProfile books
+    the writes to a write stage of their own. With `state_path` the
+    accumulated metrics are saved there as a MetricsState, so rows can be
+    appended later. `dump(label, value)`, when given, gets verbose debug
+    output, with `value` a callable that builds it.
+    """
+    report = progress or (lambda stage: None)
+    writing = (lambda: progress.span('write')) if isinstance(progress, StageProfile) else nullcontext
+    # Pass 1: column types, bucket edges and the majority/minority groups
+    report('detect')
+    detector = ColumnTypeAccumulator(sketch=binning == 'quantile')
+    for chunk in iter_clean_chunks(source, chunksize):
+        detector.update(chunk)
+    column_types = detector.column_types()
+    if dump is not None:
+        dump("Detected column types", lambda: column_types)
+
+    sensitive_columns = find_sensitive_columns(column_types)
+    metric_columns = find_metric_columns(column_types)
+    minority_values = detector.minority_values(sensitive_columns) if metric_columns else {}
+    edges = {col: detector.bins(col, bins, binning)
+             for col, type_ in column_types.items() if type_ == 'numeric'}
+
+    # Density ranges cover the original and the biased values, as on whole uploads
+    columns = density_columns(column_types)
+    if columns and all(col in detector.minimum for col in columns):
+        ranges = [_biased_range(col, detector.minimum[col], detector.maximum[col],
+                                bool(minority_values) and col in metric_columns) for col in columns]
+        density = lambda: DensityGrid(*columns, *ranges)
+    else:
+        density = lambda: None
+
+    original = ChunkSummary(column_types, edges, bins, binning, density())
+    # Injection only changes minority metric values, every other column keeps its buckets
+    biased = ChunkSummary(column_types,
+                          {col: edge for col, edge in edges.items()
+                           if is_score_column(col) or not (minority_values and col in metric_columns)},
+                          bins, binning, density())
+    differences = DifferenceAccumulator()
+
+    # Pass 2: inject, write and aggregate
+    report('inject')
+    rows = 0
+    last_row = None
+    biased_writer = FrameWriter(output_path, output_format)
+    original_writer = FrameWriter(original_output_path) if original_output_path else None
+    try:
+        for chunk in iter_clean_chunks(source, chunksize, read_dtypes(detector.dtypes)):
+            biased_chunk = apply_minority_bias(chunk.copy(), minority_values, metric_columns)
+            with writing():
+                biased_writer.write(biased_chunk)
+                if original_writer:
+                    original_writer.write(chunk)
+            original.update(chunk)
+            biased.update(biased_chunk)
+            differences.update(chunk, biased_chunk)
+            rows += len(chunk)
+            last_row = chunk.iloc[-1]
+    finally:
+        with writing():
+            biased_writer.close()
+            if original_writer:
+                original_writer.close()
+
+    # Pass 3: ranges of injected columns, read back from the biased output
+    report('analyze')
+    pending = biased.pending_range_columns()
+    biased.finish_bins()
+    if pending and rows:
+        for chunk in iter_frame_chunks(output_path, chunksize, pending):
+            biased.count_ranges(chunk)
+
+    if state_path:
+        state = MetricsState(column_types, minority_values, original, biased, differences,
+                             output_path, original_output_path, output_format)
+        state.columns = list(column_types)
+        state.row_count = rows
+        state.last_row = last_row
+        state.save(state_path)
+
+    original_bias_metrics, original_bias_present, original_group_metrics = original.bias_metrics()
+    biased_bias_metrics, biased_bias_present, biased_group_metrics = biased.bias_metrics()
+    return {
+        'original': {
+            'bias_metrics': original_bias_metrics,
+            'bias_present': original_bias_present,
+            'group_metrics': original_group_metrics,
+            'visualization_data': original.visualization_data()
+        },
+        'biased': {
+            'bias_metrics': biased_bias_metrics,
+            'bias_present': biased_bias_present,
+            'group_metrics': biased_group_metrics,
+            'visualization_data': biased.visualization_data()
+        },
+        'column_types': column_types,
+        'differences': differences.differences(),
+        'row_count': rows,
+        'chunked': True
+    }
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules live at the top of the repository; the synthetic data comes from the benchmarks
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+from synthetic import make_frame  # noqa: E402
+
+def assert_close(actual, expected):
+    """Equality of nested results, with floats compared to rounding error"""
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for key in expected:
+            assert_close(actual[key], expected[key])
+    elif isinstance(expected, (list, tuple)):
+        assert len(actual) == len(expected)
+        for left, right in zip(actual, expected):
+            assert_close(left, right)
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-9, nan_ok=True)
+    else:
+        assert actual == expected
+
+@pytest.fixture
+def loan():
+    return make_frame('loan', 3000)
+
+@pytest.fixture
+def loan_csv(loan):
+    return loan.to_csv(index=False).encode()
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Test client of the web app, writing its files under a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    import app
+    app.result_cache.clear()
+    return app.app.test_client()
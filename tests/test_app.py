@@ -0,0 +1,56 @@
+import io
+import os
+
+from app import app, artifacts
+from conftest import assert_close
+from datasets import DATASET_DIR
+from jobs import JOB_DIR
+
+def post(client, url, data, **form):
+    return client.post(url, data={'file': (io.BytesIO(data), 'loan.csv'), **form})
+
+def biased_file(result):
+    # send_file resolves paths from the app's root rather than the working directory, so read the file itself
+    return artifacts.path(os.path.basename(result['biased']['download_link']))
+
+def test_async_upload_of_cached_content_is_a_finished_job(client, loan_csv):
+    sync = post(client, '/upload', loan_csv)
+    assert sync.status_code == 200
+    queued = post(client, '/upload', loan_csv, **{'async': '1'})
+    assert queued.status_code == 202
+    assert client.get(queued.json['status_url']).json['state'] == 'done'
+    result = client.get(queued.json['result_url'])
+    assert result.status_code == 200
+    assert result.json == sync.json
+
+def test_stored_files_are_outside_the_static_folder(client, loan_csv):
+    assert post(client, '/upload', loan_csv, chunksize='1000').status_code == 200
+    assert os.listdir(DATASET_DIR)
+    static = os.path.realpath(app.static_folder)
+    for directory in (DATASET_DIR, JOB_DIR):
+        # The app runs from its root, where the directories are relative to
+        path = os.path.realpath(os.path.join(app.root_path, directory))
+        assert os.path.commonpath([static, path]) != static
+    for name in os.listdir(DATASET_DIR):
+        assert client.get(f'/download/{name}').status_code == 404
+
+def test_append_matches_fresh_upload(client, loan):
+    head = loan.iloc[:2000].to_csv(index=False).encode()
+    tail = loan.iloc[2000:].to_csv(index=False).encode()
+    dataset_id = post(client, '/upload', head, chunksize='700').json['dataset_id']
+    appended = post(client, f'/datasets/{dataset_id}/append', tail)
+    assert appended.status_code == 200
+    assert appended.json['dataset_id'] != dataset_id
+    fresh = post(client, '/upload', loan.to_csv(index=False).encode(), chunksize='700').json
+
+    assert appended.json['row_count'] == fresh['row_count'] == len(loan)
+    assert appended.json['column_types'] == fresh['column_types']
+    assert_close(appended.json['differences'], fresh['differences'])
+    for name in ('original', 'biased'):
+        expected = {key: value for key, value in fresh[name].items() if key != 'download_link'}
+        actual = {key: value for key, value in appended.json[name].items() if key != 'download_link'}
+        assert_close(actual, expected)
+    with open(biased_file(appended.json), 'rb') as f, open(biased_file(fresh), 'rb') as g:
+        assert f.read() == g.read()
+    # The uploaded dataset is left as it was
+    assert client.get(f'/datasets/{dataset_id}').json['row_count'] == 2000
@@ -0,0 +1,92 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from artifacts import MIN_AGE, ArtifactStore
+
+NOW = time.time()
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(root=str(tmp_path / 'temp'), max_bytes=10 ** 6, ttl=3600,
+                         dataset_dir=str(tmp_path / 'datasets'), job_dir=str(tmp_path / 'jobs'))
+
+def write(path, used, size=100):
+    """A file of `size` bytes, last written and read `used` seconds before NOW"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(path, (NOW - used, NOW - used))
+    return path
+
+def upload(store, used, size=100):
+    """Artifact, appended part and dataset files of one upload; returns its key and paths"""
+    key = uuid.uuid4().hex * 2
+    name = store.name(key, 'parquet')
+    paths = [write(store.path(name), used, size),
+             write(store.path(name.replace('.parquet', '.part-00001.parquet')), used, size),
+             write(os.path.join(store.dataset_dir, f'{key}.csv'), used, size),
+             write(os.path.join(store.dataset_dir, f'{key}.state'), used, size)]
+    return key, paths
+
+def exists(paths):
+    return [os.path.exists(path) for path in paths]
+
+def test_expired_groups_are_removed_whole(store):
+    _, old = upload(store, used=store.ttl + 10)
+    _, recent = upload(store, used=10)
+    stale_job = write(os.path.join(store.job_dir, 'stale.json'), used=store.ttl + 10)
+    job = write(os.path.join(store.job_dir, 'running.json'), used=10)
+    assert store.cleanup(now=NOW) == len(old) + 1
+    assert exists(old) == [False] * len(old)
+    assert exists(recent) == [True] * len(recent)
+    assert exists([stale_job, job]) == [False, True]
+
+def test_least_recently_used_groups_go_over_budget(store):
+    store.max_bytes = 1000
+    # Four files of 200 bytes per group: two groups fit, and the newest one is too recent to evict
+    _, oldest = upload(store, used=MIN_AGE + 30, size=200)
+    _, older = upload(store, used=MIN_AGE + 20, size=200)
+    _, newest = upload(store, used=MIN_AGE - 10, size=200)
+    assert store.cleanup(now=NOW) == len(oldest) + len(older)
+    assert exists(oldest + older) == [False] * (len(oldest) + len(older))
+    assert exists(newest) == [True] * len(newest)
+
+def test_reads_keep_a_group(store):
+    store.max_bytes = 1000
+    key, read = upload(store, used=MIN_AGE + 30, size=200)
+    _, unread = upload(store, used=MIN_AGE + 20, size=200)
+    store.touch(store.name(key, 'parquet'))
+    store.cleanup()
+    assert exists(unread) == [False] * len(unread)
+    assert exists(read) == [True] * len(read)
+
+def test_pinned_groups_are_kept(store):
+    store.max_bytes = 0
+    key, pinned = upload(store, used=store.ttl + 10)
+    _, other = upload(store, used=MIN_AGE + 10)
+    with store.pinned(key):
+        store.cleanup(now=NOW)
+        assert exists(pinned) == [True] * len(pinned)
+        assert exists(other) == [False] * len(other)
+    assert not store.pins
+    store.cleanup(now=NOW)
+    assert exists(pinned) == [False] * len(pinned)
+
+def test_pins_are_counted(store):
+    key, paths = upload(store, used=store.ttl + 10)
+    store.pin(key)
+    store.pin(key)
+    store.unpin(key)
+    store.cleanup(now=NOW)
+    assert exists(paths) == [True] * len(paths)
+    store.unpin(key)
+    store.cleanup(now=NOW)
+    assert exists(paths) == [False] * len(paths)
+
+def test_paths_stay_in_the_store(store):
+    for name in ('../biased_x.csv', 'loan.csv', 'biased_/../../x'):
+        with pytest.raises(FileNotFoundError):
+            store.path(name)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import parallel
+from bias_engine import apply_minority_bias, inject_group_effects
+from bias_metrics import measure_bias
+from binning import histogram_columns
+from conftest import assert_close
+from main import BiasInjector
+
+def inject(df, lazy, seed, workers=1):
+    injector = BiasInjector(df, lazy=lazy, workers=workers, seed=seed)
+    injector.inject_group_bias('gender', ['income', 'credit_score'], 0.3)
+    injector.inject_correlation_bias('credit_score', ['income'], 0.8)
+    injector.inject_temporal_bias('age', 'income', 0.5)
+    injector.inject_selection_bias('credit_score', 600, 'above')
+    return injector.biased_data
+
+def test_lazy_injection_matches_eager(loan):
+    before = loan.copy()
+    eager = inject(loan, lazy=False, seed=7)
+    pd.testing.assert_frame_equal(inject(loan, lazy=True, seed=7), eager)
+    # The input is left as it was
+    pd.testing.assert_frame_equal(loan, before)
+    assert len(eager) < len(loan)
+
+def test_seed_fixes_the_noise(loan):
+    pd.testing.assert_frame_equal(inject(loan, lazy=True, seed=3), inject(loan, lazy=True, seed=3))
+    assert not inject(loan, lazy=True, seed=3).equals(inject(loan, lazy=True, seed=4))
+
+@pytest.fixture
+def sharded(monkeypatch):
+    """Shard every frame, however small, over the process pool"""
+    monkeypatch.setattr(parallel, 'PARALLEL_MIN_ROWS', 0)
+    yield 2
+    # The sharded path ran, not the serial fallback
+    assert parallel._pools
+    parallel.shutdown_pools()
+
+def test_parallel_group_effects_match_serial(loan, sharded):
+    effects = {'income': {'Female': (0.8, np.inf)}, 'credit_score': {'Female': (0.9, 50.0), 'Male': (1.1, np.inf)}}
+    for keys in (loan['gender'], loan['gender'].astype('category')):
+        df = loan.assign(gender=keys)
+        serial = inject_group_effects(df.copy(), 'gender', effects)
+        pd.testing.assert_frame_equal(inject_group_effects(df.copy(), 'gender', effects, workers=sharded), serial)
+
+def test_parallel_minority_bias_matches_serial(loan, sharded):
+    minority = {'gender': 'Female'}
+    serial = apply_minority_bias(loan.copy(), minority, ['income', 'credit_score'])
+    parallel_result = apply_minority_bias(loan.copy(), minority, ['income', 'credit_score'], workers=sharded)
+    pd.testing.assert_frame_equal(parallel_result, serial)
+
+def test_parallel_injector_matches_serial(loan, sharded):
+    pd.testing.assert_frame_equal(inject(loan, lazy=True, seed=7, workers=sharded), inject(loan, lazy=True, seed=7))
+
+def test_parallel_metrics_match_serial(loan, sharded):
+    numeric = loan[['income', 'credit_score']]
+    frames = {'original': numeric, 'biased': numeric * 0.9}
+    serial = measure_bias(loan, frames, ['gender', 'education_level'], list(numeric))
+    assert_close(measure_bias(loan, frames, ['gender', 'education_level'], list(numeric), workers=sharded), serial)
+    for method in ('width', 'quantile'):
+        serial = histogram_columns(numeric, list(numeric), method=method)
+        assert histogram_columns(numeric, list(numeric), method=method, workers=sharded) == serial
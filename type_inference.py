@@ -0,0 +1,162 @@
+import math
+
+import numpy as np
+import pandas as pd
+from sampling import sample_rows
+
+# Rows sampled per frame when deciding column types
+TYPE_SAMPLE_SIZE = 10_000
+# Columns with fewer distinct values than this share of the rows are categorical
+CATEGORICAL_RATIO = 0.5
+# 2**14 HyperLogLog registers: about 0.8% relative error in the distinct count
+HLL_PRECISION = 14
+
+class DistinctSketch:
+    """
+    HyperLogLog estimate of the number of distinct non-null values in a column.
+
+    Memory is 2**precision bytes whatever the column length, and sketches of
+    separate chunks can be merged by taking the register-wise maximum.
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def error(self):
+        """Relative standard error of estimate()"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, values):
+        hashes = pd.util.hash_pandas_object(pd.Series(values).dropna(), index=False).to_numpy()
+        if not len(hashes):
+            return
+        shift = np.uint64(64 - self.precision)
+        index = (hashes >> shift).astype(np.int64)
+        # Rank = position of the first set bit in the remaining bits; a sentinel bit caps it
+        rest = (hashes << np.uint64(self.precision)) | np.uint64(1 << (self.precision - 1))
+        # Bit length via the float exponent, exact for the 32-bit halves
+        high = (rest >> np.uint64(32)).astype(float)
+        bit_length = np.frexp(high)[1] + 32
+        low = high == 0
+        if low.any():
+            bit_length[low] = np.frexp((rest[low] & np.uint64(0xFFFFFFFF)).astype(float))[1]
+        rank = (65 - bit_length).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.exp2(-self.registers.astype(float)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Small cardinalities: linear counting over the empty registers is more accurate
+            return m * math.log(m / zeros)
+        return float(raw)
+
+def _is_categorical(values, sample, rows):
+    limit = CATEGORICAL_RATIO * rows
+    # Every distinct value owns at least one row, so a column with `limit` or more of them
+    # has about that share of a uniform sample distinct; this bound is six standard
+    # deviations below it
+    if sample.nunique() < CATEGORICAL_RATIO * len(sample) - 3 * math.sqrt(len(sample)):
+        return True
+    if pd.api.types.is_numeric_dtype(values):
+        # Hashing numbers is cheaper than nunique's hash table; strings are faster counted exactly
+        sketch = DistinctSketch()
+        sketch.update(values)
+        estimate = sketch.estimate()
+        if abs(estimate - limit) > 3 * sketch.error * limit:
+            return estimate < limit
+    # Strings, and estimates too close to call: count exactly
+    return values.nunique() < limit
+
+def _is_numeric(values, sample):
+    if pd.api.types.is_numeric_dtype(values):
+        return True
+    # One value in the sample that does not convert settles it
+    converted = pd.to_numeric(sample, errors='coerce')
+    if (converted.isna() & sample.notna()).any():
+        return False
+    try:
+        pd.to_numeric(values, errors='raise')
+        return True
+    except Exception:
+        return False
+
+def infer_column_types(df, sample_size=TYPE_SAMPLE_SIZE, seed=0):
+    """
+    Same decisions as detect_column_types, mostly from a sample of the rows.
+
+    A column is categorical when it has fewer distinct values than half the
+    rows: clear cases are settled by the sample, numeric columns by a
+    HyperLogLog estimate unless it lands within its error margin of the
+    cut-off, and everything else is counted exactly. Numeric conversion is only attempted on
+    the full column when every sampled value converts.
+    """
+    sample = sample_rows(df, sample_size, seed)
+    column_types = {}
+    for column in df.columns:
+        try:
+            if _is_categorical(df[column], sample[column], len(df)):
+                column_types[column] = 'categorical'
+            elif _is_numeric(df[column], sample[column]):
+                column_types[column] = 'numeric'
+            else:
+                column_types[column] = 'text'
+        except Exception as e:
+            print(f"Error processing column {column}: {str(e)}")
+            column_types[column] = 'text'
+    return column_types
+
+def merge_dtypes(dtypes, chunk):
+    """
+    Fold the column dtypes of one chunk into those seen in earlier chunks.
+
+    Numeric columns whose chunks disagree are widened (int64 and float64
+    give float64). Any other disagreement records None, meaning read_csv has
+    to keep inferring that column.
+    """
+    for column, dtype in chunk.dtypes.items():
+        if column not in dtypes:
+            dtypes[column] = dtype
+            continue
+        seen = dtypes[column]
+        if seen is None or seen == dtype:
+            continue
+        if seen.kind in 'iuf' and dtype.kind in 'iuf':
+            dtypes[column] = np.result_type(seen, dtype)
+        else:
+            dtypes[column] = None
+    return dtypes
+
+def read_dtypes(dtypes, columns=None):
+    """dtype= argument for read_csv from merged dtypes, optionally limited to `columns`"""
+    return {column: str(dtype) for column, dtype in dtypes.items()
+            if dtype is not None and (columns is None or column in columns)}
+
+def encode_categories(df, column_types):
+    """
+    Store text columns detected as categorical with the category dtype.
+
+    Each distinct value is kept once and rows hold small integer codes, so
+    group masks, group lookups and groupbys work on the codes instead of
+    hashing the strings again. Categories are in order of first appearance,
+    which keeps unique(), groupby(sort=False) and the codes in the same
+    order. Numeric columns are left alone. Returns a new frame; the columns
+    of `df` are not changed.
+    """
+    encoded = {}
+    for column, type_ in column_types.items():
+        if type_ != 'categorical' or column not in df.columns:
+            continue
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype):
+            continue
+        codes, categories = pd.factorize(values, sort=False)
+        encoded[column] = pd.Categorical.from_codes(codes, categories=categories)
+    return df.assign(**encoded) if encoded else df